@@ -1,255 +1,804 @@
+import hashlib
 import logging
-import urllib
-from time import sleep
-from typing import List
+import threading
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from time import time
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Union
 
 import requests
-from selenium import webdriver
-from selenium.webdriver import ActionChains
-from selenium.webdriver.common.actions.action_builder import ActionBuilder
-from selenium.webdriver.common.by import By
 from tqdm import tqdm
 
+from filters import NUMERIC_KEYS, FilterEngine, parse_grams, parse_prices
+from history import PriceHistory
+from strain_store import StrainStore
+from utils.catalog_cache import CatalogCache
 from utils.custom_logger import Logger
+from utils.driver_pool import DriverPool
+from utils.inventory_cache import InventoryCache
+from utils.json_stream import iter_array_items
+from utils.listing_parser import parse_listing
+from utils.metrics import Metrics
+from utils.price_cache import PriceCache
+from utils.session_cache import SessionCache
+from utils.transport import Transport, TransportError
 from strain import Strain
 
-logger = Logger().get_logger()
+# Selenium is only imported once a browser is actually needed
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
 
+logger = Logger().get_logger()
 
-def pause():
-    sleep(0.5)
+# Reads a whole listing page in one round-trip: every product anchor, and whether there is a next page
+LISTING_SCRIPT = """
+const products = Array.from(
+    document.querySelectorAll("a.js-equalized-name[data-productid]"),
+    (a) => [a.getAttribute("data-productid"), a.innerText, a.href],
+);
+const next = document.querySelector("li.page-item.next");
+return [products, next !== null && !next.classList.contains("disabled")];
+"""
+
+
+class SessionRejected(Exception):
+    """
+    Raised when the inventory API turns down the session cookies, e.g. with a 401/403 or a log-in page.
+    """
+
+# Clicks 'Next' and returns the first product of the current page, to wait for it to go stale
+NEXT_PAGE_SCRIPT = """
+const first = document.querySelector("a.js-equalized-name[data-productid]");
+document.querySelector("li.page-item.next a.page-link").click();
+return first;
+"""
+
+
+def apply_prices(
+    prices: List[dict], strains: Dict[str, Strain], records: dict = None
+) -> List[str]:
+    """
+    Applies a `calculatePrices` response to the strains, in a single pass.
+    :param prices: A list of price JSON dict from the SQDC API.
+    :param strains: The strains to update, keyed by product ID.
+    :param records: If given, the raw price of each strain is stored in it. See `Agent.run_filter_sets`.
+    :return: The product IDs with no price or with an unreasonably low price, to remove.
+    """
+    strains_to_remove: List[str] = []
+    unknown = 0
+    get = strains.get
+    for price in prices:
+        product_id = price["ProductId"]
+        strain = get(product_id)
+        # Corner case, should not run, as no unseen strains should be in the list
+        if strain is None:
+            unknown += 1
+            continue
+
+        if records is not None:
+            records[product_id][1] = price
+
+        # Variant price if set, default price otherwise. If neither parses, or the price
+        # is very low (probably a mistake), skip
+        parsed = parse_prices(price)
+        if parsed is None or parsed[0] < 1 or parsed[1] < 1:
+            strains_to_remove.append(product_id)
+            continue
+        strain.display_price, strain.list_price = parsed
+
+    if unknown:
+        logger.warning("%d priced strain(s) not found in the inventory.", unknown)
+    return strains_to_remove
+
+
+def apply_names(strains: Dict[str, Strain], products: list, pending: set) -> int:
+    """
+    Applies the entries of a listing page to the strains, in a single pass.
+    :param strains: The strains to update, keyed by product ID.
+    :param products: A list of (product_id, name, url) tuples. See `utils.listing_parser`.
+    :param pending: The product IDs still to be found. Updated IDs are removed from it.
+    :return: The number of strains updated.
+    """
+    strains_updated: int = 0
+    unknown = 0
+    get = strains.get
+    for product_id, name, url in products:
+        strain = get(product_id)
+        # Listed but not priced, e.g. priced too low
+        if strain is None:
+            unknown += 1
+            continue
+        strain.name = name
+        strain.url = url
+        strains_updated += 1
+
+    pending.difference_update(product_id for product_id, _, _ in products)
+    if unknown:
+        logger.debug("%d listed strain(s) not found in priced strains.", unknown)
+    return strains_updated
 
 
 class Agent:
-    def __init__(self, day: int, month: int, year: int) -> None:
+    BASE_URL = "https://www.sqdc.ca"
+    DEFAULT_FILTERS = {
+        "InStock": "in store",
+        "DominantSpecies": ["Indica", "Sativa"],
+        "ProductAccessibilityLookupValue": "3",  # Weed strength (1-3)
+        "Format": "3.5 g",
+    }
+    # How long Selenium waits for an element before giving up, in seconds
+    WAIT_TIMEOUT = 10
+
+    def __init__(
+        self,
+        day: int,
+        month: int,
+        year: int,
+        base_url: str = None,
+        session_cache: SessionCache = None,
+        transport: Transport = None,
+        price_chunk_size: int = 100,
+        price_workers: int = 4,
+        price_cache: PriceCache = None,
+        strain_store: StrainStore = None,
+        history: PriceHistory = None,
+        metrics: Metrics = None,
+        driver_pool: DriverPool = None,
+        catalog_cache: CatalogCache = None,
+        inventory_cache: InventoryCache = None,
+    ) -> None:
         """
         Initializes the agent.
         :param day: The day of birth
         :param month: The month of birth
         :param year: The year of birth
+        :param base_url: The root of the SQDC website. Override to point at a local stub server.
+        :param session_cache: Where to persist the session cookies between runs. Defaults to `out/session.json`.
+        :param transport: The HTTP transport used for every request. See `utils.transport.Transport`.
+        :param price_chunk_size: The maximum number of SKUs priced in a single request.
+        :param price_workers: The maximum number of pricing requests sent at the same time.
+        :param price_cache: Where to cache prices between runs. Defaults to `out/prices.db`.
+        :param strain_store: Where to save the scanned strains. Defaults to `out/strains.db`.
+        :param history: Where to record price and stock changes. Defaults to `out/history.db`.
+        :param metrics: Where to record per-stage timings and counts. Disabled by default.
+        :param driver_pool: The headless Chrome drivers borrowed when a browser is needed. Share it between
+        agents to reuse warm, logged-in drivers. See `utils.driver_pool.DriverPool`.
+        :param catalog_cache: Where to cache the names and URLs of known SKUs. Defaults to `out/catalog.db`.
+        :param inventory_cache: Where to keep the last inventory of each store, so unchanged SKUs are not
+        repriced. Defaults to `out/inventory.db`.
         """
         self.__debug = logger.level > logging.DEBUG
         self.__DAY = str(day)
         self.__MONTH = str(month)
         self.__YEAR = str(year)
+        self.__base_url = (base_url or self.BASE_URL).rstrip("/")
+        self.__session_cache = session_cache or SessionCache()
+        self.__transport = transport or Transport()
+        self.__price_chunk_size = price_chunk_size
+        self.__price_workers = price_workers
+        self.__price_cache = price_cache or PriceCache()
+        self.__strain_store = strain_store or StrainStore()
+        self.__history = history or PriceHistory()
+        self.__metrics = metrics or Metrics(enabled=False)
+        self.__metrics.gauge("transport_retries_total", lambda: self.__transport.retry_count)
+        self.__cookies: dict = {}
+        self.__session_checked_at: float = 0.0
+        # Bumped by every log-in after a rejection, so concurrent scans only log in once
+        self.__session_generation: int = 0
+        self.__login_lock = threading.Lock()
+        # Headers only change with the cookies, so they are built once per (store, referer)
+        self.__headers: dict = {}
+        # Drivers are only launched if a browser is actually needed
+        self.__driver_pool = driver_pool or DriverPool()
+        self.__catalog_cache = catalog_cache or CatalogCache()
+        self.__inventory_cache = inventory_cache or InventoryCache()
 
     def run(
-        self, store_id: int, filters: dict = None, save_files: bool = True
+        self,
+        store_id: int,
+        filters: dict = None,
+        save_files: bool = True,
+        browserless: bool = True,
     ) -> List[Strain]:
         """
         Extracts strain data from the SQDC website.
         :param store_id: The store ID to extract data from.
         :param filters: The filters to apply to the SQDC website. See `build_filter_url` for more info.
-        :param save_files: Whether to save the strain objects to file.
+        :param save_files: Whether to save the strain objects to the strain store.
+        :param browserless: Whether to fetch the listing pages over plain HTTP to resolve names and URLs.
+        Selenium pagination is only used as a fallback if this fails.
         :return: A list of strain objects.
         """
-        self.__init_driver()
-        self.__login()
-        self.__set_cookies()
+        self.__ensure_session(store_id)
+        return self.__scan_or_log_in(store_id, filters, save_files, browserless)
+
+    def scan_stores(
+        self,
+        store_ids: List[int],
+        filters: dict = None,
+        save_files: bool = True,
+        browserless: bool = True,
+        max_workers: int = 4,
+    ) -> Dict[int, Union[List[Strain], Exception]]:
+        """
+        Extracts strain data from several stores, sharing a single log-in.
+        Stores are scanned concurrently, and a failure in one store does not abort the others.
+        :param store_ids: The store IDs to extract data from.
+        :param filters: The filters to apply to the SQDC website. See `build_filter_url` for more info.
+        :param save_files: Whether to save the strain objects to the strain store.
+        :param browserless: Whether to resolve names and URLs over plain HTTP. See `run`.
+        :param max_workers: The maximum number of stores scanned at the same time.
+        :return: A mapping of store ID to its strains, or to the exception that made its scan fail.
+        """
+        results: Dict[int, Union[List[Strain], Exception]] = {}
+        if not store_ids:
+            return results
+
+        self.__ensure_session(store_ids[0])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self.__scan_or_log_in, store_id, filters, save_files, browserless
+                ): store_id
+                for store_id in store_ids
+            }
+            for future in tqdm(
+                as_completed(futures),
+                total=len(futures),
+                disable=self.__debug,
+                desc="Scanning stores",
+            ):
+                store_id = futures[future]
+                try:
+                    results[store_id] = future.result()
+                    logger.info(
+                        f"Store {store_id}: {len(results[store_id]):,} strains found."
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to scan store {store_id}: {e}")
+                    results[store_id] = e
 
-        default_filter = {
-            "InStock": "in store",
-            "DominantSpecies": ["Indica", "Sativa"],
-            "ProductAccessibilityLookupValue": "3",  # Weed strength (1-3)
-            "Format": "3.5 g",
-        }
-        filters = filters or default_filter
-        url = self.build_filter_url(filters)
+        # Most likely the session expired, so check it again on the next sweep
+        if all(isinstance(result, Exception) for result in results.values()):
+            self.__session_checked_at = 0.0
 
-        # Find all product elements
-        self.driver.get(url)
-        strains: dict[str, Strain] = self.__extract_strain_data(store_id, filters)
+        return results
 
-        # Get info from all pages
-        current_page = 1
-        while True:
-            logger.info(f"Processing page {current_page:,}...")
-            num_updated = self.__extract_names(strains)
-            logger.debug(f"Updated {num_updated:,} strains.")
-            # Load next page or break
-            if not self.__load_next_page():
-                logger.info("No more pages to load. Stopping scan...")
-                break
-            else:
-                current_page += 1
+    def run_filter_sets(
+        self, store_id: int, filter_sets: List[dict], browserless: bool = True
+    ) -> List[List[Strain]]:
+        """
+        Answers several filter combinations from a single, unfiltered fetch of a store.
+        Filters are evaluated locally against the inventory and price JSON. Attribute filters (species,
+        strength, format) are not in the JSON, so they are checked against the listing they filter,
+        resolved once per distinct combination from the catalog cache. See `filters.FilterEngine`.
+        :param store_id: The store ID to extract data from.
+        :param filter_sets: The filter combinations to evaluate.
+        :param browserless: Whether to resolve names and URLs over plain HTTP. See `run`.
+        :return: The matching strains of each filter combination, in order.
+        """
+        self.__ensure_session(store_id)
+
+        filters = {"InStock": "in store"}
+        records: dict = {}
+        generation = self.__session_generation
+        try:
+            strains = self.__extract_strain_data(store_id, filters, records)
+        except SessionRejected as e:
+            logger.warning(f"{e} Logging in again...")
+            self.__log_in_again(generation)
+            records = {}
+            strains = self.__extract_strain_data(store_id, filters, records)
+        self.__resolve_names(self.build_filter_url(filters), store_id, strains, browserless)
+
+        # --- Resolve the SKUs of each distinct filtered listing once --- #
+        listings: Dict[str, set] = {}
+        engines = []
+        for filter_set in filter_sets:
+            attributes = FilterEngine.listing_filters(filter_set)
+            listing = None
+            if attributes:
+                url = self.build_filter_url({**filters, **attributes})
+                if url not in listings:
+                    matched = self.__resolve_names(
+                        url, store_id, strains, browserless, every=True
+                    )
+                    listings[url] = {strains[product_id].sku for product_id in matched}
+                listing = listings[url]
+            engines.append(FilterEngine(filter_set, listing=listing))
+
+        processed = [
+            (strain, records[product_id])
+            for product_id, strain in strains.items()
+            if strain.is_processed
+        ]
+        return [
+            [strain for strain, (item, price) in processed if engine.matches(item, price)]
+            for engine in engines
+        ]
+
+    def __scan_or_log_in(
+        self, store_id: int, filters: dict, save_files: bool, browserless: bool
+    ) -> List[Strain]:
+        """
+        Scans a single store, logging in again and retrying once if the inventory rejects the session.
+        The session probe only prices no products, so it can pass with cookies the inventory turns down.
+        See `run` for the parameters.
+        :return: A list of strain objects.
+        """
+        generation = self.__session_generation
+        try:
+            return self.__scan_store(store_id, filters, save_files, browserless)
+        except SessionRejected as e:
+            logger.warning(f"{e} Logging in again...")
+        self.__log_in_again(generation)
+        return self.__scan_store(store_id, filters, save_files, browserless)
+
+    def __log_in_again(self, generation: int) -> None:
+        """
+        Drops the rejected session and logs in, unless another thread already did since `generation`.
+        :param generation: The session generation the rejected request was sent with.
+        """
+        with self.__login_lock:
+            if generation != self.__session_generation:
+                return
+            with self.__metrics.stage("session"):
+                self.__session_cache.clear()
+                self.__cookies = {}
+                self.__headers = {}
+                self.__start_browser()
+            self.__session_checked_at = time()
+            self.__session_generation += 1
+
+    def __scan_store(
+        self, store_id: int, filters: dict, save_files: bool, browserless: bool
+    ) -> List[Strain]:
+        """
+        Extracts strain data from a single store, using the current session.
+        See `run` for the parameters.
+        :return: A list of strain objects.
+        """
+        filters = filters or self.DEFAULT_FILTERS
+        listing_url = self.build_filter_url(filters)
+
+        # --- Step 1: Fetch the inventory, only pricing the SKUs that are new or whose quantity changed --- #
+        snapshot = self.__inventory_cache.get(store_id, listing_url)
+        previous_digest, known = snapshot or (None, {})
+        digest = hashlib.blake2b(digest_size=16)
+        strains: dict[str, Strain] = self.__extract_strain_data(
+            store_id, filters, known=known, digest=digest
+        )
+        reused = sum(1 for strain in strains.values() if known.get(strain.sku) is strain)
+        logger.info(
+            f"Inventory of store {store_id}: {reused:,} unchanged strain(s), "
+            f"{len(strains) - reused:,} new or changed."
+        )
+
+        # --- Step 2: Resolve the missing names. Those in the catalog cache are only looked up in SQLite --- #
+        unnamed = sum(1 for strain in strains.values() if strain.name is None)
+        # One listing per format, so the weight of every strain is known
+        formats = filters.get("Format")
+        for fmt in formats if isinstance(formats, list) else [formats]:
+            listing = filters if fmt is None else {**filters, "Format": fmt}
+            self.__resolve_names(
+                self.build_filter_url(listing),
+                store_id,
+                strains,
+                browserless,
+                grams=parse_grams(fmt) if fmt else None,
+            )
 
-        # Close the driver
-        self.driver.quit()
+        # A snapshot left with unnamed strains, e.g. by a walk that stopped early, is completed here
+        named = unnamed - sum(1 for strain in strains.values() if strain.name is None)
+        if digest.hexdigest() != previous_digest or reused != len(strains) or named:
+            self.__inventory_cache.put(
+                store_id,
+                listing_url,
+                digest.hexdigest(),
+                list(strains.values()),
+                refreshed=reused == 0,
+            )
 
-        # Save strains to file
+        # Save strains to the strain store, in a single transaction
         if save_files:
-            logger.debug("Saving strains to file...")
+            logger.debug("Saving strains to the strain store...")
+            processed = []
             for strain in strains.values():
                 if strain.is_processed:
-                    strain.save("out/strains")
-                    logger.info(f'Strain "{strain.name}" saved.')
+                    processed.append(strain)
                 else:
                     logger.debug(
-                        f'Skipping strain "{strain.sku}" as it is not fully processed.'
+                        'Skipping strain "%s" as it is not fully processed.', strain.sku
                     )
+            with self.__metrics.stage("save") as sample:
+                self.__strain_store.save_many(
+                    store_id, processed, in_stock=[s.sku for s in strains.values()]
+                )
+                sample.add("items", len(processed))
+            logger.info(f"{len(processed):,} strains saved.")
+
+            # Prices and stock do not depend on the listing, so every priced strain is tracked
+            with self.__metrics.stage("history") as sample:
+                sample.add("items", self.__history.record(store_id, list(strains.values())))
 
         return list(strains.values())
 
-    def __load_next_page(self) -> bool:
+    def __resolve_names(
+        self,
+        url: str,
+        store_id: int,
+        strains: dict[str, Strain],
+        browserless: bool,
+        grams: float = None,
+        every: bool = False,
+    ) -> set:
         """
-        Clicks the 'Next' button if it is not disabled.
-        :return: True if there is a next page, False otherwise.
+        Fills in the names and URLs of the strains on a filtered listing, from the catalog cache where possible.
+        The listing is only walked if some SKUs were never looked up on it, and only until all of them are found.
+        Strains that are not on the listing do not match its filters, and are left without a name.
+        :param url: The filtered listing URL. See `build_filter_url` for more info.
+        :param store_id: The store ID to use.
+        :param strains: The strains dictionary to update.
+        :param browserless: Whether to walk the listing over plain HTTP. See `run`.
+        :param grams: The weight of the listing's format, set on the strains found on it.
+        :param every: Whether to look up every strain, and not only those without a name yet.
+        :return: The product IDs of the looked up strains found on the listing.
         """
-        # Find the 'Next' button
-        next_button = self.driver.find_element(
-            By.CSS_SELECTOR, "li.page-item.next a.page-link"
+        # Strains named by the listing of another format are not looked up again
+        candidates = [
+            p for p, strain in strains.items() if every or strain.name is None
+        ]
+        with self.__metrics.stage("catalog") as sample:
+            known = self.__catalog_cache.get_many(
+                url, [strains[p].sku for p in candidates]
+            )
+            matched, pending = [], set()
+            for product_id in candidates:
+                strain = strains[product_id]
+                if strain.sku not in known:
+                    pending.add(product_id)
+                elif known[strain.sku] is not None:
+                    strain.name, strain.url = known[strain.sku]
+                    matched.append(product_id)
+            sample.add("hits", len(known))
+            sample.add("misses", len(pending))
+        logger.info(
+            f"Catalog cache for store {store_id}: {len(known):,} hit(s), "
+            f"{len(pending):,} miss(es)."
         )
 
-        # Check if the 'Next' button is disabled
-        is_disabled = "disabled" in next_button.find_element(
-            By.XPATH, ".."
-        ).get_attribute("class")
-
-        if not is_disabled:
-            next_button.click()
-
-        return not is_disabled
-
-    def __extract_names(self, strains: dict[str, Strain]) -> int:
+        if pending:
+            # Get names and URLs from the listing pages, over HTTP if possible
+            unseen = set(pending)
+            complete = self.__fetch_names(url, store_id, strains, pending) if browserless else None
+            if complete is None:
+                if browserless:
+                    logger.warning("Browserless name extraction failed, using Selenium.")
+                complete = self.__scrape_names(url, strains, pending)
+
+            found = unseen - pending
+            matched.extend(found)
+            entries = {strains[p].sku: (strains[p].name, strains[p].url) for p in found}
+            if pending and complete:
+                # The whole listing was walked, so the rest are not on it
+                entries.update((strains[p].sku, None) for p in pending)
+                logger.info(f"{len(pending):,} strain(s) do not match the listing filters.")
+            elif pending:
+                logger.warning(
+                    f"The listing walk stopped early, {len(pending):,} strain(s) left unresolved."
+                )
+            self.__catalog_cache.put_many(url, entries)
+
+        if grams is not None:
+            for product_id in matched:
+                strains[product_id].grams = grams
+        return set(matched)
+
+    def __fetch_names(
+        self, url: str, store_id: int, strains: dict[str, Strain], pending: set
+    ) -> Optional[bool]:
         """
-        Extracts the names of the strains from the website.
+        Fetches the listing pages over plain HTTP and extracts the names and URLs of the strains.
+        :param url: The filtered listing URL. See `build_filter_url` for more info.
+        :param store_id: The store ID to use.
         :param strains: The strains dictionary to update.
-        :return: The number of strains updated.
+        :param pending: The product IDs still to be found. Found IDs are removed, and pagination stops once it is empty.
+        :return: Whether the walk reached the last page or found every pending strain, or None if
+        Selenium should be used instead.
         """
-        strains_updated: int = 0
-        product_listing = self.driver.find_elements(
-            By.CSS_SELECTOR, "a.js-equalized-name[data-productid]"
-        )
+        headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-CA",
+            "Cookie": self.__build_cookie_header(store_id),
+        }
 
-        # Update strain objects
-        for product in tqdm(
-            product_listing, disable=self.__debug, desc="Extracting names"
-        ):
-            # Corner case, should not run, as no unseen strains should be in the list
-            product_id: str = product.get_attribute("data-productid")
-            if product_id not in strains.keys():
-                logger.warning(f"Strain {product_id} not found in priced strains")
-                continue
+        current_page = 1
+        while True:
+            logger.info(f"Fetching page {current_page:,}...")
+            page_url = f"{url}&page={current_page}"
+            with self.__metrics.stage("names_page") as sample:
+                try:
+                    response = self.__transport.get(page_url, headers=headers)
+                except (requests.RequestException, TransportError) as e:
+                    logger.warning(f"Failed to fetch listing page {current_page}: {e}")
+                    return None
+
+                if response.status_code != 200:
+                    logger.warning(
+                        f"Failed to fetch listing page {current_page}. Status: {response.status_code}"
+                    )
+                    return None
+
+                products, has_next, is_listing = parse_listing(response.text, page_url)
+                sample.add("bytes_in", len(response.content))
+                sample.add("items", len(products))
+            # An empty listing has no matches, but a page that is not a listing is the age gate
+            if not is_listing:
+                logger.warning(f"Listing page {current_page} was not served, most likely the age gate.")
+                return None
 
-            # Update strain object
-            strains[product_id].name = product.text
-            strains[product_id].url = product.get_attribute("href")
-            strains_updated += 1
-            logger.debug(f"Strain `{strains[product_id].name}` extracted.")
+            num_updated = apply_names(strains, products, pending)
+            logger.debug(f"Updated {num_updated:,} strains.")
 
-        return strains_updated
+            if not pending:
+                logger.info("All unseen strains found. Stopping scan...")
+                return True
+            if not has_next:
+                logger.info("No more pages to fetch. Stopping scan...")
+                return True
+            if not products:
+                logger.warning(f"Listing page {current_page} is empty but not the last one.")
+                return False
+            current_page += 1
+
+    def __scrape_names(self, url: str, strains: dict[str, Strain], pending: set) -> bool:
+        """
+        Walks the listing pages in Selenium and extracts the names and URLs of the strains.
+        :param url: The filtered listing URL. See `build_filter_url` for more info.
+        :param strains: The strains dictionary to update.
+        :param pending: The product IDs still to be found. See `__fetch_names`.
+        :return: Whether the walk reached the last page or found every pending strain.
+        """
+        # Concurrent store scans each borrow their own driver, waiting if the pool is exhausted.
+        # Borrowing may launch Chrome, so it is timed like in `__start_browser`.
+        with ExitStack() as stack:
+            with self.__metrics.stage("init_driver"):
+                driver = stack.enter_context(self.__driver_pool.borrow())
+            if not self.__driver_pool.is_logged_in(driver):
+                with self.__metrics.stage("login"):
+                    self.__login(driver)
+                    self.__set_cookies(driver)
+            driver.get(url)
+            current_page = 1
+            while True:
+                logger.info(f"Processing page {current_page:,}...")
+                with self.__metrics.stage("names_page_selenium") as sample:
+                    products, has_next = driver.execute_script(LISTING_SCRIPT)
+                    # Collapse whitespace the same way `utils.listing_parser` does
+                    products = [
+                        (product_id, " ".join(text.split()), href)
+                        for product_id, text, href in products
+                    ]
+                    num_updated = apply_names(strains, products, pending)
+                    sample.add("items", num_updated)
+                logger.debug(f"Updated {num_updated:,} strains.")
+                # Load next page or break
+                if not pending:
+                    logger.info("All unseen strains found. Stopping scan...")
+                    return True
+                if not has_next:
+                    logger.info("No more pages to load. Stopping scan...")
+                    return True
+                if not products:
+                    logger.warning(f"Listing page {current_page} is empty but not the last one.")
+                    return False
+                self.__load_next_page(driver)
+                current_page += 1
 
-    def __extract_strain_data(self, store_id: int, filters: dict) -> dict[str, Strain]:
+    def __load_next_page(self, driver: "WebDriver") -> None:
+        """
+        Clicks the 'Next' button, and waits for the listing to be replaced.
+        :param driver: The driver showing the listing.
+        """
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        first = driver.execute_script(NEXT_PAGE_SCRIPT)
+        if first is not None:
+            WebDriverWait(driver, self.WAIT_TIMEOUT).until(EC.staleness_of(first))
+
+    def __extract_strain_data(
+        self,
+        store_id: int,
+        filters: dict,
+        records: dict = None,
+        known: Dict[str, Strain] = None,
+        digest: "hashlib._Hash" = None,
+    ) -> dict[str, Strain]:
         """
-        Extracts the SKU and quantity of each strain from the website.
+        Extracts the SKU, quantity and prices of each strain from the website.
+        The inventory is streamed, and in-stock SKUs are sent for pricing in batches
+        while the rest of the inventory is still downloading.
         :param store_id: The store ID to extract data from.
         :param filters: The filters to apply to the SQDC website. See `build_filter_url` for more info.
-        :return: A list of strain objects.
+        :param records: If given, filled with the raw [inventory item, price] JSON of each strain, keyed by product ID.
+        :param known: The strains of the previous fetch, keyed by SKU. See `utils.inventory_cache`.
+        Known strains whose quantities are unchanged are returned as-is instead of being priced again.
+        :param digest: If given, updated with the raw inventory payload.
+        :return: A dictionary of priced strain objects, keyed by product ID.
         """
-        items: List[dict] = self.__get_store_inventory(store_id, filters)
-        logger.debug(f"Found {len(items):,} items in store {store_id}")
-
         strains: dict[str, Strain] = {}
+        batches: List[Future] = []
+        batch: List[str] = []
+        to_price = 0
+
+        with ThreadPoolExecutor(max_workers=self.__price_workers) as executor:
+            # --- Step 1: Filter out strains with 0 quantity, price the rest in batches --- #
+            for strain in self.__iter_in_stock(store_id, filters, records, digest):
+                previous = known.get(strain.sku) if known else None
+                if (
+                    previous is not None
+                    and previous.quantity == strain.quantity
+                    and previous.quantity_to_promise == strain.quantity_to_promise
+                ):
+                    strains[strain.product_id] = previous
+                    continue
+                strains[strain.product_id] = strain
+                to_price += 1
+                batch.append(strain.sku)
+                if len(batch) >= self.__price_chunk_size:
+                    batches.append(
+                        executor.submit(self.__get_cached_prices, batch, store_id)
+                    )
+                    batch = []
+            if batch:
+                batches.append(executor.submit(self.__get_cached_prices, batch, store_id))
+            logger.debug(f"Found {len(strains):,} in-stock items in store {store_id}")
+
+            # --- Step 2: Remove strains with no/wrong pricing --- #
+            hits = 0
+            for future in tqdm(batches, disable=self.__debug, desc="Pricing strains"):
+                prices, batch_hits = future.result()
+                hits += batch_hits
+                for product_id in apply_prices(prices, strains, records):
+                    del strains[product_id]
+
+        logger.info(
+            f"Price cache for store {store_id}: {hits:,} hit(s), "
+            f"{to_price - hits:,} miss(es)."
+        )
+        return strains
 
-        # --- Step 1: Filter out strains with 0 quantity --- #
-        for item in tqdm(
-            items, disable=self.__debug, desc="Filtering strains with no quantity"
-        ):
+    def __iter_in_stock(
+        self,
+        store_id: int,
+        filters: dict,
+        records: dict = None,
+        digest: "hashlib._Hash" = None,
+    ) -> Iterator[Strain]:
+        """
+        Streams the inventory of a store, skipping items with no quantity.
+        :param store_id: The store ID to extract data from.
+        :param filters: The filters to apply to the SQDC website. See `build_filter_url` for more info.
+        :param records: If given, the raw inventory item of each strain is stored in it. See `__extract_strain_data`.
+        :param digest: If given, updated with the raw inventory payload. See `__iter_store_inventory`.
+        :return: An iterator of strain objects with their SKU and quantities set.
+        """
+        for item in self.__iter_store_inventory(store_id, filters, digest):
             # Ignore items with 0 quantity
             _q = item["Quantity"]
             if _q["Quantity"] == 0 or _q["AvailableToPromiseQuantity"] == 0:
                 continue
-            # Build strain object
-            current_strain = Strain(
+            strain = Strain(
                 sku=item["Sku"],
                 quantity=_q["Quantity"],
                 promised_quantity=_q["AvailableToPromiseQuantity"],
             )
+            if records is not None:
+                records[strain.product_id] = [item, None]
+            yield strain
 
-            # Add strain to dictionary
-            strains[current_strain.product_id] = current_strain
-
-        # --- Step 2: Calculate prices --- #
-        prices = self.__get_prices([s.sku for s in strains.values()], store_id)
-
-        # --- Step 3: Remove strains with no/wrong pricing --- #
-        strains_to_remove = self.__price_strains(prices, strains)
-        for product_id in strains_to_remove:
-            del strains[product_id]
-
-        # Filter to only processed and return
-        return strains
-
-    def __price_strains(self, prices: List[dict], strains: dict[str, Strain]):
-        """
-        Applies the prices to the strains.
-        :param prices: A list of price JSON dict from the SQDC API.
-        :param strains: A dictionary of strains to update.
-        :return: A list of strains with no price or with an unreasonably low price, to remove.
-        """
-        strains_to_remove: List[str] = []
-        for _p in tqdm(
-            prices, disable=self.__debug, desc="Filtering strains with no price"
-        ):
-            # Corner case, should not run, as no unseen strains should be in the list
-            product_id = _p["ProductId"]
-            if product_id not in strains.keys():
-                logger.warning(f"Strain {_p['ProductId']} not found in all_strains")
-                continue
-
-            # If no variant price set, try default price. If that fails, skip
-            if "VariantPrices" not in _p or len(_p["VariantPrices"]) == 0:
-                try:
-                    display_price = float(_p["DisplayPrice"].replace("$", ""))
-                    list_price = float(_p["DefaultListPrice"].replace("$", ""))
-                except Exception as _:
-                    strains_to_remove.append(product_id)
-                    continue
-            # If variant price set, use that
-            else:
-                _v = _p["VariantPrices"][0]
-                display_price = float(_v["DisplayPrice"].replace("$", ""))
-                list_price = float(_v["ListPrice"].replace("$", ""))
-
-            # Ignore very low prices, probably a mistake
-            if display_price < 1 or list_price < 1:
-                strains_to_remove.append(product_id)
-                continue
-
-            # Update strain object
-            strains[product_id].display_price = display_price
-            strains[product_id].list_price = list_price
+    def __start_browser(self) -> None:
+        """
+        Borrows a driver, logs in and refreshes the session cookies.
+        The log-in is always redone, as the cookies the driver holds were just rejected.
+        """
+        with self.__metrics.stage("init_driver"):
+            driver = self.__driver_pool.acquire()
+        try:
+            with self.__metrics.stage("login"):
+                self.__login(driver)
+                self.__set_cookies(driver)
+        except Exception:
+            self.__driver_pool.release(driver, discard=True)
+            raise
+        self.__driver_pool.release(driver)
+
+    def __ensure_session(self, store_id: int) -> None:
+        """
+        Makes sure the agent holds accepted session cookies. A session that was checked
+        less than the session cache TTL ago is trusted as-is, so repeated scans skip the probe.
+        :param store_id: The store ID to probe the API with.
+        """
+        if self.__cookies and time() - self.__session_checked_at < self.__session_cache.ttl:
+            return
 
-        return strains_to_remove
+        # Reuse the cached session if it is still accepted, otherwise log in
+        with self.__metrics.stage("session"):
+            if not self.__restore_session(store_id):
+                self.__start_browser()
+        self.__session_checked_at = time()
 
-    def __init_driver(self) -> None:
+    def __restore_session(self, store_id: int) -> bool:
         """
-        Initializes the Selenium driver, and sets the window size.
+        Loads the cached session cookies and checks that the SQDC API still accepts them.
+        :param store_id: The store ID to probe the API with.
+        :return: True if the cached session is usable, False if a log-in is needed.
         """
-        self.driver = webdriver.Chrome()
-        ActionBuilder(self.driver).clear_actions()
-        self.driver.implicitly_wait(2)
-        self.driver.set_window_size(1024, 768)
-
-    def __login(self) -> None:
+        cookies = self.__session_cache.load()
+        if not cookies:
+            logger.info("No cached session found.")
+            return False
+
+        self.__cookies = cookies
+        self.__headers = {}
+        if self.__probe_session(store_id):
+            logger.info("Reusing cached session.")
+            return True
+
+        logger.info("Cached session was rejected, logging in again.")
+        self.__session_cache.clear()
+        self.__cookies = {}
+        self.__headers = {}
+        return False
+
+    def __probe_session(self, store_id: int) -> bool:
+        """
+        Sends a pricing request for no products to check whether the current cookies are accepted.
+        It goes through the same session checks as the inventory, without downloading a whole store.
+        :param store_id: The store ID to use.
+        :return: True if the API answered with prices.
+        """
+        url = self.__build_url("product/calculatePrices")
+        payload = {"products": []}
+        headers = self.__build_header(store_id)
+        try:
+            response = self.__transport.post(url, json=payload, headers=headers)
+            return response.status_code == 200 and "ProductPrices" in response.json()
+        except (requests.RequestException, TransportError, ValueError) as e:
+            logger.debug(f"Session probe failed: {e}")
+            return False
+
+    def __login(self, driver: "WebDriver") -> None:
         """
         Accepts the cookies and enters the date of birth
         on the SQDC website.
+        :param driver: The driver to log in with.
         """
+        from selenium.webdriver import ActionChains
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
         logger.info("Starting log-in sequence...")
-        self.driver.get("https://www.sqdc.ca/en-CA/")
+        driver.get(f"{self.__base_url}/en-CA/")
+        wait = WebDriverWait(driver, self.WAIT_TIMEOUT)
 
         # Step 1: Accept Cookies
         logger.info("Attempting to accept cookies")
-        cookie_box = self.driver.find_element(By.ID, "didomi-notice-agree-button")
-        ActionChains(self.driver).move_to_element(cookie_box).click().perform()
-        pause()
+        cookie_box = wait.until(
+            EC.element_to_be_clickable((By.ID, "didomi-notice-agree-button"))
+        )
+        ActionChains(driver).move_to_element(cookie_box).click().perform()
+        wait.until(EC.invisibility_of_element(cookie_box))
 
         # Step 2: Enter Date of Birth
         logger.info("Attempting to find DoB fields...")
-        month_input = self.driver.find_element(By.ID, "month")
-        day_input = self.driver.find_element(By.ID, "day")
-        year_input = self.driver.find_element(By.ID, "year")
+        month_input = wait.until(EC.visibility_of_element_located((By.ID, "month")))
+        day_input = wait.until(EC.visibility_of_element_located((By.ID, "day")))
+        year_input = wait.until(EC.visibility_of_element_located((By.ID, "year")))
 
         # Enter the date of birth
         # Replace these with the desired date
@@ -259,23 +808,26 @@ class Agent:
         year_input.send_keys(self.__YEAR)
 
         # Locate the submit button and click it
-        submit_button = self.driver.find_element(
-            By.CSS_SELECTOR, "button[type='submit']"
-        )
+        submit_button = driver.find_element(By.CSS_SELECTOR, "button[type='submit']")
         submit_button.click()
+        # The age gate is gone once the button is hidden or removed
+        wait.until(EC.invisibility_of_element(submit_button))
+        self.__driver_pool.mark_logged_in(driver)
         logger.info("Log-in sequence complete.")
 
-    def __set_cookies(self):
+    def __set_cookies(self, driver: "WebDriver"):
         """
-        Extracts the cookies from Selenium and stores them for requests.
-        :return:
+        Extracts the cookies from Selenium, stores them for requests and caches them to disk.
+        :param driver: The logged-in driver.
         """
         logger.debug("Extracting cookies...")
         # Extract cookies from Selenium and format them for requests
-        selenium_cookies = self.driver.get_cookies()
+        selenium_cookies = driver.get_cookies()
         self.__cookies = {
             cookie["name"]: cookie["value"] for cookie in selenium_cookies
         }
+        self.__headers = {}
+        self.__session_cache.save(selenium_cookies)
         logger.debug("Cookies extracted.")
 
     def __build_cookie_header(self, store_id: int) -> str:
@@ -300,6 +852,10 @@ class Agent:
         :param referer: The website to use as the referer.
         :return: The header.
         """
+        key = (store_id, referer)
+        if key in self.__headers:
+            return self.__headers[key]
+
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json, text/javascript, */*; q=0.01",
@@ -307,14 +863,15 @@ class Agent:
             "Sec-Fetch-Site": "same-origin",
             "Sec-Fetch-Mode": "cors",
             "Sec-Fetch-Dest": "empty",
-            "Host": "www.sqdc.ca",
+            "Host": urllib.parse.urlparse(self.__base_url).netloc,
             "Cookie": self.__build_cookie_header(store_id),
-            "Origin": "https://www.sqdc.ca",
-            "Referer": referer or "https://www.sqdc.ca/en-CA/Stores",
+            "Origin": self.__base_url,
+            "Referer": referer or f"{self.__base_url}/en-CA/Stores",
             "Connection": "keep-alive",
             "X-Requested-With": "XMLHttpRequest",
             "WebsiteId": "f3dbd28d-365f-4d3e-91c3-7b730b39b294",
         }
+        self.__headers[key] = headers
         return headers
 
     def __build_url(self, endpoint: str) -> str:
@@ -323,7 +880,7 @@ class Agent:
         :param endpoint: The endpoint to use.
         :return: The URL.
         """
-        return f"https://www.sqdc.ca/api/{endpoint}"
+        return f"{self.__base_url}/api/{endpoint}"
 
     def build_filter_url(self, filters: dict = None) -> str:
         """
@@ -334,14 +891,17 @@ class Agent:
         - ProductAccessibilityLookupValue: "1", "2", or "3" (weed strength)
         - Format: "3.5 g", "7 g", "15 g", "28 g", or "1 g"
 
+        Keys only understood locally, such as MinPrice, are left out. See `filters.FilterEngine`.
         :param filters: The filters to apply to the SQDC website.
         :return: The URL.
         """
-        base_url = "https://www.sqdc.ca/en-CA/dried-cannabis/dried-flowers?&"
+        base_url = f"{self.__base_url}/en-CA/dried-cannabis/dried-flowers?&"
         params = {}
         if filters:
             i = 1
             for key, value in filters.items():
+                if key in NUMERIC_KEYS:
+                    continue
                 params[f"fn{i}"] = key
                 if type(value) == list:
                     params[f"fv{i}"] = "|".join(value)
@@ -351,50 +911,99 @@ class Agent:
 
         return base_url + urllib.parse.urlencode(params)
 
+    def __get_cached_prices(
+        self, skus: List[str], store_id
+    ) -> Tuple[List[dict], int]:
+        """
+        Gets the prices of the given SKUs, only requesting those missing from or stale in the price cache.
+        :param skus: The SKUs to get the prices of.
+        :param store_id: The store ID to use.
+        :return: The cached and freshly requested prices as a list of JSON dicts, and the number of cache hits.
+        """
+        cached = self.__price_cache.get_many(store_id, skus)
+        missing = [sku for sku in skus if sku not in cached]
+
+        prices = list(cached.values())
+        if missing:
+            fetched = self.__get_prices(missing, store_id)
+            self.__price_cache.put_many(
+                store_id, {_p["ProductId"].removesuffix("-P"): _p for _p in fetched}
+            )
+            prices.extend(fetched)
+
+        return prices, len(cached)
+
     def __get_prices(self, skus: List[str], store_id) -> List[dict]:
         """
-        Gets the prices of the given SKUs.
+        Gets the prices of the given SKUs in a single request. Callers keep batches to `price_chunk_size`
+        and send them concurrently, see `__extract_strain_data`. Transient failures are retried by the
+        transport, so a failing batch does not cause the others to be requested again.
         :param skus: The SKUs to get the prices of.
         :param store_id: The store ID to use.
         :return: The response from the SQDC API as a list of JSON dicts.
         """
-        logger.info(f"Requesting prices for {len(skus):,} sku(s)...")
+        logger.debug(f"Requesting prices for {len(skus):,} sku(s)...")
         url = self.__build_url("product/calculatePrices")
         payload = {"products": [f"{sku}-P" for sku in skus]}
         headers = self.__build_header(store_id)
 
-        response = requests.post(
-            url, json=payload, headers=headers, cookies=self.__cookies
-        )
+        with self.__metrics.stage("pricing") as sample:
+            response = self.__transport.post(url, json=payload, headers=headers)
 
-        if response.status_code != 200:
-            logger.error(f"Failed to calculate prices. Message: {response.text}")
-            raise Exception("Failed to calculate prices")
+            if response.status_code != 200:
+                logger.error(f"Failed to calculate prices. Message: {response.text}")
+                raise Exception("Failed to calculate prices")
 
-        logger.info("Prices calculated.")
-        return response.json()["ProductPrices"]
+            prices = response.json()["ProductPrices"]
+            sample.add("bytes_out", len(response.request.body or b""))
+            sample.add("bytes_in", len(response.content))
+            sample.add("items", len(prices))
+        return prices
 
-    def __get_store_inventory(self, store_id: int, filters: dict = None) -> List[dict]:
+    def __iter_store_inventory(
+        self, store_id: int, filters: dict = None, digest: "hashlib._Hash" = None
+    ) -> Iterator[dict]:
         """
-        Gets the inventory of a store.
+        Streams the inventory of a store, yielding each item as soon as it is received.
         :param store_id: The store ID to get the inventory of.
         :param filters: The filters to apply to the SQDC website. See `build_filter_url` for more info.
-        :return: The inventory of the store as a list of JSON dicts.
+        :param digest: If given, a `hashlib` hash updated with every chunk of the raw payload, so
+        unchanged inventories can be told apart without keeping a copy.
+        :return: An iterator of the inventory items of the store, as JSON dicts.
         """
         url = self.__build_url("olivestoreinventory/getmystoreinventory")
         payload = {"InventoryLocationId": store_id}
         referer = self.build_filter_url(filters=filters)
         headers = self.__build_header(store_id, referer=referer)
 
-        response = requests.post(
-            url, json=payload, headers=headers, cookies=self.__cookies
-        )
-
-        if response.status_code != 200:
-            raise Exception(
-                f"Failed to get store inventory for store {store_id}. Message: {response.text}"
+        # Streamed, so the duration includes the processing of the items as they arrive
+        with self.__metrics.stage("inventory") as sample:
+            response = self.__transport.post(
+                url, json=payload, headers=headers, stream=True
             )
 
-        items = response.json()["InventoryItems"]
+            with response:
+                # An expired session is answered with an error, or redirected to a log-in page
+                content_type = response.headers.get("Content-Type", "")
+                if response.status_code in (401, 403) or (
+                    response.status_code == 200 and "json" not in content_type
+                ):
+                    raise SessionRejected(
+                        f"Store inventory for store {store_id} was rejected with status "
+                        f"{response.status_code} ({content_type or 'no content type'})."
+                    )
+                if response.status_code != 200:
+                    raise Exception(
+                        f"Failed to get store inventory for store {store_id}. Message: {response.text}"
+                    )
+
+                def _chunks():
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        sample.add("bytes_in", len(chunk))
+                        if digest is not None:
+                            digest.update(chunk)
+                        yield chunk
 
-        return items
+                for item in iter_array_items(_chunks(), "InventoryItems"):
+                    sample.add("items")
+                    yield item
@@ -0,0 +1,125 @@
+"""
+Checks the browserless name resolution against listing pages saved from the SQDC website.
+
+    python -m bench.check_listing
+
+The pages in `bench/fixtures` are parsed on their own, then replayed by the stub server for a full
+`Agent.run`, which must walk both pages, stop at the disabled 'Next' button and name every listed strain.
+The exit status is 1 if any check fails.
+"""
+import logging
+import os
+import sys
+import tempfile
+
+from agent import Agent
+from bench.run import start_stub
+from history import PriceHistory
+from strain_store import StrainStore
+from utils.catalog_cache import CatalogCache
+from utils.custom_logger import Logger
+from utils.inventory_cache import InventoryCache
+from utils.listing_parser import parse_listing
+from utils.metrics import Metrics
+from utils.price_cache import PriceCache
+from utils.session_cache import SessionCache
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PAGE_URL = "https://www.sqdc.ca/en-CA/Search?page=1"
+# The products of each saved page, as (product_id, name, path)
+PAGES = {
+    "page-1.html": [
+        ("628582000011-P", "Bruce Banner", "/en-CA/p-bruce-banner/628582000011-P/628582000011"),
+        ("628582000012-P", "Pink & Kush", "/en-CA/p-pink-kush/628582000012-P/628582000012"),
+        ("628582000013-P", "Blue Dream", "/en-CA/p-blue-dream/628582000013-P/628582000013"),
+    ],
+    "page-2.html": [
+        ("628582000014-P", "Lemon Haze", "/en-CA/p-lemon-haze/628582000014-P/628582000014"),
+        ("628582000015-P", "Jean Guy", "/en-CA/p-jean-guy/628582000015-P/628582000015"),
+    ],
+}
+# In stock, but not on the listing
+UNLISTED = "628582000016"
+
+
+def read(filename: str) -> str:
+    with open(os.path.join(FIXTURES, filename), encoding="utf-8") as f:
+        return f.read()
+
+
+def check(name: str, passed: bool, detail: str = "") -> bool:
+    print(f"{'ok' if passed else 'FAIL':<4}  {name}{f': {detail}' if detail and not passed else ''}")
+    return passed
+
+
+def check_parser() -> bool:
+    passed = True
+    for index, (filename, expected) in enumerate(PAGES.items()):
+        products, has_next, is_listing = parse_listing(read(filename), PAGE_URL)
+        expected = [
+            (product_id, name, f"https://www.sqdc.ca{path}") for product_id, name, path in expected
+        ]
+        passed &= check(f"{filename} products", products == expected, f"{products}")
+        last = index == len(PAGES) - 1
+        passed &= check(f"{filename} has_next", has_next != last, f"{has_next}")
+        passed &= check(f"{filename} is a listing", is_listing)
+
+    products, has_next, is_listing = parse_listing(read("age-gate.html"), PAGE_URL)
+    passed &= check("age-gate.html is not a listing", not is_listing and not products)
+    return passed
+
+
+def check_agent() -> bool:
+    process, base_url = start_stub(size=0, latency=0, fixtures=FIXTURES)
+    metrics = Metrics()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            session_cache = SessionCache(os.path.join(directory, "session.json"))
+            # The stub accepts any cookie, so the Chrome log-in is never needed
+            session_cache.save([{"name": "bench", "value": "1"}])
+            catalog_cache = CatalogCache(os.path.join(directory, "catalog.db"))
+            agent = Agent(
+                day=1,
+                month=1,
+                year=1990,
+                base_url=base_url,
+                session_cache=session_cache,
+                price_cache=PriceCache(os.path.join(directory, "prices.db")),
+                strain_store=StrainStore(os.path.join(directory, "strains.db")),
+                history=PriceHistory(os.path.join(directory, "history.db")),
+                catalog_cache=catalog_cache,
+                inventory_cache=InventoryCache(os.path.join(directory, "inventory.db")),
+                metrics=metrics,
+            )
+            filters = {"InStock": "in store"}
+            strains = agent.run(store_id=1, filters=filters, save_files=False)
+            misses = catalog_cache.get_many(agent.build_filter_url(filters=filters), [UNLISTED])
+    finally:
+        process.terminate()
+        process.wait()
+
+    expected = {
+        product_id[:-2]: (name, f"{base_url}{path}")
+        for products in PAGES.values()
+        for product_id, name, path in products
+    }
+    named = {s.sku: (s.name, s.url) for s in strains if s.is_processed}
+    pages = metrics.snapshot()["stages"].get("names_page", {}).get("count", 0)
+    passed = check("every listed strain is named", named == expected, f"{named}")
+    passed &= check("the walk stops at the last page", pages == len(PAGES), f"{pages} page(s)")
+    passed &= check(
+        "unlisted strains are cached as missing", misses == {UNLISTED: None}, f"{misses}"
+    )
+    return passed
+
+
+def main() -> int:
+    # Only the checks are printed
+    Logger.set_level(logging.WARNING)
+    passed = check_parser()
+    passed = check_agent() and passed
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Pins the per-item cost of the agent's hot loops, without any network or browser.
+
+    python -m bench.micro --output bench/micro.json
+    python -m bench.micro --compare bench/micro.json --tolerance 1.5
+
+Each case is timed on synthetic data, best of `--repeat` runs, and reported in nanoseconds per item.
+The exit status is 1 if any case goes over its budget in `BUDGETS_NS`, or with `--compare`, if it got
+slower than the baseline times the tolerance, so it can gate a commit.
+"""
+import argparse
+import gc
+import json
+import logging
+import platform
+import sys
+import time
+from typing import Callable, Dict
+
+from agent import apply_names, apply_prices
+from bench.run import git_commit
+from strain import Strain
+from utils.custom_logger import Logger
+from utils.listing_parser import parse_listing
+
+# Products per listing page, as on the SQDC website
+PAGE_SIZE = 24
+# Ceilings per item, in nanoseconds, a few times above the cost measured on a laptop. Logging or a
+# browser round-trip per item blows well past them.
+BUDGETS_NS = {"apply_prices": 4000, "apply_names": 2000, "parse_listing": 150000}
+
+
+def make_strains(n: int) -> Dict[str, Strain]:
+    return {f"{i:012d}-P": Strain(sku=f"{i:012d}") for i in range(n)}
+
+
+def make_prices(n: int) -> list:
+    return [
+        {
+            "ProductId": f"{i:012d}-P",
+            "DisplayPrice": f"${20 + i % 30}.50",
+            "DefaultListPrice": f"${22 + i % 30}.44",
+            "VariantPrices": [],
+        }
+        for i in range(n)
+    ]
+
+
+def make_products(n: int) -> list:
+    return [
+        (f"{i:012d}-P", f"Strain {i}", f"https://www.sqdc.ca/en-CA/p-strain-{i}/{i:012d}-P/{i:012d}")
+        for i in range(n)
+    ]
+
+
+def make_page(start: int) -> str:
+    tiles = "".join(
+        f'<div class="product-tile"><a class="js-equalized-name" data-productid="{i:012d}-P" '
+        f'href="/en-CA/p-strain-{i}/{i:012d}-P/{i:012d}">\n  Strain   {i}\n</a></div>'
+        for i in range(start, start + PAGE_SIZE)
+    )
+    return f"<html><body>{tiles}<ul><li class='page-item next'><a class='page-link' href='#'>Next</a></li></ul></body></html>"
+
+
+def time_case(setup: Callable, run: Callable, items: int, repeat: int) -> float:
+    """
+    :param setup: Builds the fresh input of a run, untimed.
+    :param run: Processes the input.
+    :return: The best time per item, in nanoseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        data = setup()
+        # As in `timeit`, collections are kept out of the timings
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            run(data)
+            best = min(best, time.perf_counter() - started)
+        finally:
+            gc.enable()
+    return best / items * 1e9
+
+
+def benchmark(items: int, repeat: int) -> dict:
+    prices = make_prices(items)
+    products = make_products(items)
+    pages = [make_page(start) for start in range(0, items, PAGE_SIZE)]
+    page_url = "https://www.sqdc.ca/en-CA/Search"
+
+    cases = {
+        "apply_prices": (
+            lambda: make_strains(items),
+            lambda strains: apply_prices(prices, strains),
+            items,
+        ),
+        "apply_names": (
+            lambda: (make_strains(items), set()),
+            lambda data: apply_names(data[0], products, data[1]),
+            items,
+        ),
+        "parse_listing": (
+            lambda: pages,
+            lambda pages: [parse_listing(page, page_url) for page in pages],
+            len(pages) * PAGE_SIZE,
+        ),
+    }
+
+    results = {}
+    # Per-item logging is the usual regression, so the cases are timed with and without debug logs
+    for level in (logging.INFO, logging.DEBUG):
+        Logger.set_level(level)
+        for name, (setup, run, count) in cases.items():
+            case = f"{name}[{logging.getLevelName(level).lower()}]"
+            results[case] = time_case(setup, run, count, repeat)
+            print(f"  {case:<24} {results[case]:>10,.0f} ns/item")
+    Logger.set_level(logging.WARNING)
+    return results
+
+
+def check_budgets(results: dict) -> bool:
+    """
+    :return: Whether every case is within its budget.
+    """
+    passed = True
+    for case, ns in results.items():
+        budget = BUDGETS_NS[case.split("[")[0]]
+        if ns > budget:
+            print(f"  {case:<24} over budget: {ns:,.0f} > {budget:,} ns/item")
+            passed = False
+    return passed
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    :return: Whether every case is within the tolerance of the baseline.
+    """
+    print(f"\nCompared to {baseline['meta']['commit']} (tolerance x{tolerance:,.2f}):")
+    passed = True
+    for case, ns in current["results"].items():
+        before = baseline["results"].get(case)
+        if not before:
+            continue
+        ratio = ns / before
+        regressed = ratio > tolerance
+        passed = passed and not regressed
+        print(f"  {case:<24} x{ratio:,.2f}{'  REGRESSED' if regressed else ''}")
+    return passed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time the agent's per-item loops.")
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the results as JSON.")
+    parser.add_argument("--compare", help="A previous results file to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=1.5, help="The slowdown allowed against the baseline."
+    )
+    args = parser.parse_args()
+
+    # Only the timings are printed
+    Logger.set_level(logging.WARNING)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "items": args.items,
+            "repeat": args.repeat,
+        },
+        "results": benchmark(args.items, args.repeat),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    passed = check_budgets(report["results"])
+    if args.compare:
+        with open(args.compare) as f:
+            passed = compare(report, json.load(f), args.tolerance) and passed
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Times each stage of `Agent.run` against the stub server, for synthetic stores of several sizes.
+
+    python -m bench.run --sizes 100 1000 10000 50000 --repeat 5 --output bench/results.json
+    python -m bench.run --compare bench/results.json
+
+Results are written as JSON along with the commit they were measured on, so runs can be compared across commits.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from agent import Agent
+from history import PriceHistory
+from strain_store import StrainStore
+from utils.catalog_cache import CatalogCache
+from utils.custom_logger import Logger
+from utils.inventory_cache import InventoryCache
+from utils.metrics import Metrics
+from utils.price_cache import PriceCache
+from utils.session_cache import SessionCache
+
+# Stages recorded by the agent's metrics. See `utils.metrics.Metrics`. Inventory and pricing overlap,
+# as pricing starts while the inventory streams in, so "pricing" is the time spent in pricing requests
+# across all threads, and "names" the sum of every listing page.
+STAGES = {
+    "login": "session",
+    "inventory": "inventory",
+    "pricing": "pricing",
+    "names": "names_page",
+    "save": "save",
+    "history": "history",
+}
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q * (len(values) - 1)))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(size: int, latency: float, fixtures: str = None) -> tuple:
+    port = free_port()
+    command = [sys.executable, "-m", "bench.stub_server", "--port", str(port)]
+    command += ["--size", str(size), "--latency", str(latency)]
+    if fixtures:
+        command += ["--fixtures", fixtures]
+    process = subprocess.Popen(command)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("The stub server did not start.")
+
+
+def run_once(base_url: str) -> dict:
+    """
+    Runs a cold scan of store 1 in a fresh output directory.
+    :return: The total duration of each stage in seconds, the peak traced memory in bytes and the number of strains.
+    """
+    metrics = Metrics()
+    with tempfile.TemporaryDirectory() as directory:
+        session_cache = SessionCache(os.path.join(directory, "session.json"))
+        # The stub accepts any cookie, so the Chrome log-in is never needed
+        session_cache.save([{"name": "bench", "value": "1"}])
+        agent = Agent(
+            day=1,
+            month=1,
+            year=1990,
+            base_url=base_url,
+            session_cache=session_cache,
+            price_cache=PriceCache(os.path.join(directory, "prices.db")),
+            strain_store=StrainStore(os.path.join(directory, "strains.db")),
+            history=PriceHistory(os.path.join(directory, "history.db")),
+            catalog_cache=CatalogCache(os.path.join(directory, "catalog.db")),
+            inventory_cache=InventoryCache(os.path.join(directory, "inventory.db")),
+            metrics=metrics,
+        )
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        strains = agent.run(store_id=1, filters={"InStock": "in store"})
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    # Stages called several times per run, such as pricing chunks, are summed
+    recorded = metrics.snapshot()["stages"]
+    stages = {
+        stage: recorded.get(name, {}).get("seconds_total", 0.0)
+        for stage, name in STAGES.items()
+    }
+    stages["total"] = elapsed
+    return {"stages": stages, "peak": peak, "strains": len(strains)}
+
+
+def benchmark(sizes: list, repeat: int, latency: float, fixtures: str = None) -> dict:
+    results = {}
+    for size in sizes:
+        process, base_url = start_stub(size, latency, fixtures)
+        try:
+            runs = [run_once(base_url) for _ in range(repeat)]
+        finally:
+            process.terminate()
+            process.wait()
+
+        totals = [run["stages"]["total"] for run in runs]
+        result = {
+            "skus": size,
+            "strains": runs[-1]["strains"],
+            "throughput_skus_per_s": size / statistics.median(totals),
+            "peak_memory_mb": max(run["peak"] for run in runs) / 1024**2,
+            "stages": {},
+        }
+        for stage in ["total", *STAGES]:
+            values = [run["stages"][stage] for run in runs]
+            result["stages"][stage] = {
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+            }
+        results[str(size)] = result
+        print_result(result)
+    return results
+
+
+def print_result(result: dict) -> None:
+    print(
+        f"\n{result['skus']:,} SKUs ({result['strains']:,} strains): "
+        f"{result['throughput_skus_per_s']:,.0f} SKU/s, peak {result['peak_memory_mb']:,.1f} MB"
+    )
+    for stage, values in result["stages"].items():
+        print(f"  {stage:<10} p50 {values['p50_ms']:>10,.1f} ms   p95 {values['p95_ms']:>10,.1f} ms")
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"\nCompared to {baseline['meta']['commit']}:")
+    for size, result in current["results"].items():
+        if size not in baseline["results"]:
+            continue
+        before = baseline["results"][size]["stages"]
+        for stage, values in result["stages"].items():
+            if stage in before and before[stage]["p50_ms"]:
+                ratio = values["p50_ms"] / before[stage]["p50_ms"]
+                print(f"  {size:>6} SKUs {stage:<10} p50 x{ratio:,.2f}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Agent.run against a stub server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0, help="Stub latency, in ms.")
+    parser.add_argument("--fixtures", help="Directory of recorded responses to replay.")
+    parser.add_argument("--output", help="Where to write the results as JSON.")
+    parser.add_argument("--compare", help="A previous results file to compare against.")
+    args = parser.parse_args()
+
+    Logger.set_level(logging.WARNING)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency_ms": args.latency,
+            "repeat": args.repeat,
+            "fixtures": args.fixtures,
+        },
+        "results": benchmark(args.sizes, args.repeat, args.latency, args.fixtures),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
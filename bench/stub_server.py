@@ -0,0 +1,180 @@
+"""
+A local stand-in for the SQDC website, serving the inventory, calculatePrices and listing pages
+of a synthetic catalog, or replaying recorded responses.
+
+    python -m bench.stub_server --port 8765 --size 1000 --latency 20
+
+Recorded responses are read from a fixtures directory, if given:
+- inventory.json: a getmystoreinventory response
+- prices.json: a calculatePrices response covering the inventory
+- page-{n}.html: the listing pages, starting at 1
+"""
+import argparse
+import json
+import os
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 24
+# Synthetic SKUs cycle through the formats, so listings can be filtered on them
+FORMATS = ["3.5 g", "7 g", "15 g", "28 g"]
+
+
+class Catalog:
+    def __init__(self, size: int, fixtures: str = None):
+        """
+        :param size: The number of SKUs in the synthetic catalog. Ignored when replaying fixtures.
+        :param fixtures: A directory of recorded responses to replay instead.
+        """
+        self.size = size
+        self.fixtures = fixtures
+        self.__in_stock = {}
+        self.__prices = {}
+        if fixtures:
+            with open(os.path.join(fixtures, "prices.json")) as f:
+                self.__prices = {p["ProductId"]: p for p in json.load(f)["ProductPrices"]}
+
+    @staticmethod
+    def sku(i: int) -> str:
+        return f"{628582000000 + i}"
+
+    @staticmethod
+    def format(i: int) -> str:
+        return FORMATS[i % len(FORMATS)]
+
+    def inventory(self, store_id: int) -> bytes:
+        if self.fixtures:
+            with open(os.path.join(self.fixtures, "inventory.json"), "rb") as f:
+                return f.read()
+        # Roughly one item in five is out of stock, varying by store
+        items = [
+            {
+                "Sku": self.sku(i),
+                "Quantity": {
+                    "Quantity": (i + store_id) % 5 * 7,
+                    "AvailableToPromiseQuantity": (i + store_id) % 5 * 6,
+                },
+            }
+            for i in range(self.size)
+        ]
+        return json.dumps({"InventoryItems": items}).encode()
+
+    def prices(self, product_ids: list) -> bytes:
+        if self.fixtures:
+            prices = [self.__prices[p] for p in product_ids if p in self.__prices]
+        else:
+            prices = []
+            for product_id in product_ids:
+                # Larger formats cost more, with a small discount per gram
+                i = int(product_id[:-2]) - 628582000000
+                scale = float(self.format(i).split()[0]) / 3.5 * 0.9 ** (i % len(FORMATS))
+                prices.append(
+                    {
+                        "ProductId": product_id,
+                        "DisplayPrice": f"${(i // 100 % 40 + 15.5) * scale:.2f}",
+                        "DefaultListPrice": f"${(i // 100 % 40 + 13.25) * scale:.2f}",
+                        "VariantPrices": [],
+                    }
+                )
+        return json.dumps({"ProductPrices": prices}).encode()
+
+    def listing(self, page: int, store_id: int, formats: set = None) -> bytes:
+        if self.fixtures:
+            filepath = os.path.join(self.fixtures, f"page-{page}.html")
+            if not os.path.exists(filepath):
+                return b"<html></html>"
+            with open(filepath, "rb") as f:
+                return f.read()
+
+        # Like the "in store" listing, only show what the store has in stock
+        key = (store_id, frozenset(formats or ()))
+        if key not in self.__in_stock:
+            self.__in_stock[key] = [
+                i
+                for i in range(self.size)
+                if (i + store_id) % 5 and (not formats or self.format(i) in formats)
+            ]
+        in_stock = self.__in_stock[key]
+        start, end = (page - 1) * PAGE_SIZE, min(page * PAGE_SIZE, len(in_stock))
+        anchors = "".join(
+            f'<div class="product-tile"><a class="js-equalized-name" data-productid="{self.sku(i)}-P" '
+            f'href="/en-CA/p-strain-{i}/{self.sku(i)}-P/{self.sku(i)}">Strain {i}</a></div>'
+            for i in in_stock[start:end]
+        )
+        disabled = "" if end < len(in_stock) else " disabled"
+        return (
+            f"<html><body>{anchors}<ul class='pagination'>"
+            f"<li class='page-item next{disabled}'><a class='page-link' href='#'>Next</a></li>"
+            f"</ul></body></html>"
+        ).encode()
+
+
+def make_handler(catalog: Catalog, latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, which stalls keep-alive clients on delayed ACKs
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            time.sleep(latency)
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path.endswith("olivestoreinventory/getmystoreinventory"):
+                self.__send(catalog.inventory(int(payload["InventoryLocationId"])))
+            elif self.path.endswith("product/calculatePrices"):
+                self.__send(catalog.prices(payload["products"]))
+            else:
+                self.__send(b'{"error": "Not found"}', status=404)
+
+        def do_GET(self):
+            time.sleep(latency)
+            query = parse_qs(urlparse(self.path).query)
+            page = int(query.get("page", ["1"])[0])
+            cookies = SimpleCookie(self.headers.get("Cookie", ""))
+            store_id = int(cookies["SelectedStore"].value) if "SelectedStore" in cookies else 1
+            # Filters are passed as fn1=Key&fv1=Value|Value pairs
+            filters = {
+                query[name][0]: query.get(f"fv{name[2:]}", [""])[0].split("|")
+                for name in query
+                if name.startswith("fn")
+            }
+            formats = set(filters["Format"]) if "Format" in filters else None
+            self.__send(catalog.listing(page, store_id, formats), content_type="text/html")
+
+        def __send(
+            self, body: bytes, status: int = 200, content_type: str = "application/json"
+        ) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub SQDC server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--size", type=int, default=1000, help="Number of SKUs.")
+    parser.add_argument("--latency", type=float, default=0, help="Added latency, in ms.")
+    parser.add_argument("--fixtures", help="Directory of recorded responses to replay.")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.size, args.fixtures)
+    server = ThreadingHTTPServer(
+        (args.host, args.port), make_handler(catalog, args.latency / 1000)
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Command-line entry point.
+
+    python cli.py scan --store 123 --store 456
+    python cli.py sweep --store 1 --store 2 --store 3 --shards 2
+    python cli.py query --store 123 -n 10 --max-price 30
+    python cli.py export --store 123 --output strains.csv
+    python cli.py export --history --output history.parquet
+    python cli.py watch --store 123
+    python cli.py serve --port 8080
+
+Each command only imports what it needs: `query` and `export` read the strain store and
+never load Selenium, requests or the agent, so they start in a few tens of milliseconds.
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import List
+
+from ranking import RANK_KEYS, RankingEngine
+from strain_store import COLUMNS, StrainStore
+from utils.custom_logger import Logger
+
+
+def _make_agent(args):
+    import os
+
+    from dotenv import load_dotenv
+
+    from agent import Agent
+
+    load_dotenv()
+    return Agent(
+        day=int(os.getenv("DAY")),
+        month=int(os.getenv("MONTH")),
+        year=int(os.getenv("YEAR")),
+        base_url=args.base_url,
+        strain_store=StrainStore(args.db),
+    )
+
+
+def scan(args) -> int:
+    from agent import Agent
+
+    agent = _make_agent(args)
+    filters = Agent.DEFAULT_FILTERS if args.filters is None else json.loads(args.filters)
+    results = agent.scan_stores(
+        args.store, filters=filters, browserless=not args.selenium
+    )
+    failed = 0
+    for store_id, result in results.items():
+        if isinstance(result, Exception):
+            print(f"{store_id}\tfailed: {result}")
+            failed += 1
+        else:
+            processed = sum(1 for strain in result if strain.is_processed)
+            print(f"{store_id}\t{processed:,} strains")
+    return 1 if failed else 0
+
+
+def sweep(args) -> int:
+    import os
+
+    from dotenv import load_dotenv
+
+    from coordinator import ShardCoordinator
+
+    load_dotenv()
+    coordinator = ShardCoordinator(
+        day=int(os.getenv("DAY")),
+        month=int(os.getenv("MONTH")),
+        year=int(os.getenv("YEAR")),
+        shards=args.shards,
+        rate_limit=args.rate_limit,
+        base_url=args.base_url,
+        checkpoint_dir=args.checkpoint_dir,
+        strain_store=StrainStore(args.db),
+    )
+    filters = None if args.filters is None else json.loads(args.filters)
+    strains = coordinator.run(
+        args.store, filters=filters, browserless=not args.selenium, resume=not args.fresh
+    )
+    coordinator.close()
+    print(f"{len(strains):,} strains, {len(coordinator.failed):,} failed store(s)")
+    return 1 if coordinator.failed else 0
+
+
+def query(args) -> int:
+    store = StrainStore(args.db)
+    engine = RankingEngine(
+        by=args.rank, k=args.n, min_quantity=args.min_quantity, max_price=args.max_price
+    )
+    deals = engine.rank(store.query(store_id=args.store, sku=args.sku))
+    store.close()
+
+    for deal in deals:
+        if args.json:
+            print(json.dumps(deal))
+        else:
+            grams = "?" if deal["grams"] is None else f"{deal['grams']:g}"
+            per_gram = deal["price_per_gram"]
+            per_gram = "" if per_gram is None else f"${per_gram:.2f}/g"
+            print(
+                f"{deal['store_id']}\t${deal['display_price']:.2f}\t{grams} g\t{per_gram}\t"
+                f"{deal['promised_quantity']:,}\t{deal['name']}\t{deal['url']}"
+            )
+    return 0
+
+
+def export(args) -> int:
+    import exporter
+
+    # Stdout has no extension to infer the format from
+    fmt = args.format or ("csv" if args.output == "-" else None)
+    options = {"fmt": fmt, "compression": args.compression}
+    if args.columns:
+        options["columns"] = tuple(args.columns.split(","))
+    if args.history:
+        from history import PriceHistory
+
+        source = PriceHistory(args.history_db)
+        exporter.export_history(
+            source, args.output, args.store, sku=args.sku, since=args.since, **options
+        )
+    else:
+        source = StrainStore(args.db)
+        exporter.export_strains(source, args.output, args.store, since=args.since, **options)
+    source.close()
+    return 0
+
+
+def watch(args) -> int:
+    from agent import Agent
+    from watcher import Watcher
+
+    filters = Agent.DEFAULT_FILTERS if args.filters is None else json.loads(args.filters)
+    watcher = Watcher(
+        _make_agent(args),
+        args.store,
+        filters=filters,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+    )
+    watcher.run_forever()
+    return 0
+
+
+def serve(args) -> int:
+    from server import QueryServer
+
+    QueryServer(StrainStore(args.db), host=args.host, port=args.port).serve_forever()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Find strains in stock at the SQDC.")
+    parser.add_argument(
+        "--db", default="out/strains.db", help="The strain store to read from and write to."
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Log debug messages too."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_scan_arguments(command):
+        command.add_argument(
+            "--store", type=int, action="append", required=True, help="A store ID. Repeatable."
+        )
+        command.add_argument(
+            "--filters", help="The filters as a JSON object. See `Agent.build_filter_url`."
+        )
+        command.add_argument(
+            "--base-url", help="The root of the SQDC website, e.g. a local stub server."
+        )
+
+    command = commands.add_parser("scan", help="Scan stores and save their strains.")
+    add_scan_arguments(command)
+    command.add_argument(
+        "--selenium", action="store_true", help="Resolve names in a browser instead of over HTTP."
+    )
+    command.set_defaults(handler=scan)
+
+    command = commands.add_parser(
+        "sweep", help="Scan many stores in parallel processes, resuming an interrupted sweep."
+    )
+    add_scan_arguments(command)
+    command.add_argument(
+        "--selenium", action="store_true", help="Resolve names in a browser instead of over HTTP."
+    )
+    command.add_argument("--shards", type=int, default=4, help="The number of worker processes.")
+    command.add_argument(
+        "--rate-limit", type=float, default=5.0, help="The requests per second of each shard."
+    )
+    command.add_argument("--checkpoint-dir", default="out/sweep")
+    command.add_argument(
+        "--fresh", action="store_true", help="Ignore the checkpoints of an interrupted sweep."
+    )
+    command.set_defaults(handler=sweep)
+
+    command = commands.add_parser("query", help="List the best deals among the saved strains.")
+    command.add_argument("--store", type=int, help="Only list strains from this store.")
+    command.add_argument("--sku", help="Only list this SKU.")
+    command.add_argument("-n", type=int, default=10, help="The number of strains to list.")
+    command.add_argument("--max-price", type=float, help="The maximum display price.")
+    command.add_argument(
+        "--min-quantity", type=int, default=0, help="The minimum number of packets available."
+    )
+    command.add_argument(
+        "--rank",
+        choices=RANK_KEYS,
+        default="display_price",
+        help="What to rank by. See `ranking.RankingEngine`.",
+    )
+    command.add_argument("--json", action="store_true", help="Print JSON lines.")
+    command.set_defaults(handler=query)
+
+    command = commands.add_parser(
+        "export", help="Export the saved strains or their history as CSV, JSON Lines or Parquet."
+    )
+    command.add_argument(
+        "--store", type=int, action="append", help="Only export this store. Repeatable."
+    )
+    command.add_argument(
+        "--since", type=float, help="Only export rows since this UNIX timestamp."
+    )
+    command.add_argument(
+        "--columns", help=f"Comma-separated columns. Defaults to {','.join(COLUMNS)}."
+    )
+    command.add_argument(
+        "-o", "--output", default="-", help="The file to write. Defaults to stdout."
+    )
+    command.add_argument(
+        "--format", choices=["csv", "jsonl", "parquet"], help="Inferred from the output by default."
+    )
+    command.add_argument(
+        "--compression", help="gzip, bz2 or xz, or a Parquet codec. Inferred from the output by default."
+    )
+    command.add_argument(
+        "--history", action="store_true", help="Export the recorded price and stock changes instead."
+    )
+    command.add_argument("--history-db", default="out/history.db")
+    command.add_argument("--sku", help="Only export the history of this SKU.")
+    command.set_defaults(handler=export)
+
+    command = commands.add_parser("watch", help="Poll stores and print what changes.")
+    add_scan_arguments(command)
+    command.add_argument("--min-interval", type=float, default=60)
+    command.add_argument("--max-interval", type=float, default=900)
+    command.set_defaults(handler=watch)
+
+    command = commands.add_parser("serve", help="Serve the saved strains over HTTP.")
+    command.add_argument("--host", default="127.0.0.1")
+    command.add_argument("--port", type=int, default=8080)
+    command.set_defaults(handler=serve)
+
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    Logger.set_level(logging.DEBUG if args.verbose else logging.INFO)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import json
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from history import PriceHistory
+from strain import Strain
+from strain_store import StrainStore
+from utils.custom_logger import Logger
+
+logger = Logger().get_logger()
+
+
+def split_shards(store_ids: List[int], shards: int) -> List[List[int]]:
+    """
+    Splits store IDs round-robin, so large and small stores (usually numbered close together) are spread out.
+    :param store_ids: The stores to split. Duplicates are dropped.
+    :param shards: The number of shards.
+    :return: The non-empty shards, in order.
+    """
+    unique = list(dict.fromkeys(store_ids))
+    return [shard for shard in (unique[i::shards] for i in range(shards)) if shard]
+
+
+def _init_worker(log_queue) -> None:
+    """
+    Runs once in every worker process. Records are sent to the coordinator, which writes them with its
+    own logging settings, so the workers never rotate the same log file.
+    :param log_queue: The queue the coordinator reads. See `Logger.receive`.
+    """
+    Logger().forward(log_queue)
+
+
+def _scan_shard(task: dict) -> Dict[int, object]:
+    """
+    Runs in a worker process: scans the stores of a shard with an agent of its own.
+    :param task: The shard's settings. See `ShardCoordinator.run`.
+    :return: A mapping of store ID to its strains, or to the error message that made its scan fail.
+    """
+    # Imported here, so the coordinating process never loads the scraping code it does not run
+    from agent import Agent
+    from utils.catalog_cache import CatalogCache
+    from utils.driver_pool import DriverPool
+    from utils.inventory_cache import InventoryCache
+    from utils.price_cache import PriceCache
+    from utils.session_cache import SessionCache
+    from utils.transport import Transport
+
+    Logger.set_level(task["log_level"])
+    # Every database the agent opens is the shard's own, the coordinator alone writes the shared ones
+    directory = task["directory"]
+    agent = Agent(
+        day=task["day"],
+        month=task["month"],
+        year=task["year"],
+        base_url=task["base_url"],
+        session_cache=SessionCache(os.path.join(directory, "session.json")),
+        transport=Transport(rate_limit=task["rate_limit"]),
+        price_cache=PriceCache(os.path.join(directory, "prices.db")),
+        strain_store=StrainStore(os.path.join(directory, "strains.db")),
+        history=PriceHistory(os.path.join(directory, "history.db")),
+        driver_pool=DriverPool(size=1),
+        catalog_cache=CatalogCache(os.path.join(directory, "catalog.db")),
+        inventory_cache=InventoryCache(os.path.join(directory, "inventory.db")),
+    )
+    results = agent.scan_stores(
+        task["store_ids"],
+        filters=task["filters"],
+        save_files=False,
+        browserless=task["browserless"],
+        max_workers=task["store_workers"],
+    )
+    # Exceptions do not always survive pickling, their message does
+    return {
+        store_id: str(result) if isinstance(result, Exception) else result
+        for store_id, result in results.items()
+    }
+
+
+class ShardCoordinator:
+    def __init__(
+        self,
+        day: int,
+        month: int,
+        year: int,
+        shards: int = 4,
+        rate_limit: Optional[float] = 5.0,
+        store_workers: int = 2,
+        base_url: str = None,
+        checkpoint_dir: str = "out/sweep",
+        strain_store: StrainStore = None,
+        history: PriceHistory = None,
+    ):
+        """
+        Sweeps many stores with a pool of worker processes. Stores are split into shards, and each shard is
+        scanned by its own agent, with its own log-in, session and rate budget, so parsing and pricing are
+        not bound by a single interpreter or session.
+        Finished stores are checkpointed to disk as each shard completes, so an interrupted sweep only
+        rescans what was left. Checkpoints are removed once a sweep completes without failures, while the
+        shard sessions and caches are kept for the next sweep.
+
+            coordinator = ShardCoordinator(day=1, month=1, year=1990, shards=4)
+            strains = coordinator.run(store_ids=range(1, 101))
+
+        :param day: The day of birth
+        :param month: The month of birth
+        :param year: The year of birth
+        :param shards: The number of shards, and of worker processes.
+        :param rate_limit: The maximum number of requests per second of each shard, or None for no limit.
+        :param store_workers: The number of stores each shard scans at the same time. See `Agent.scan_stores`.
+        :param base_url: The root of the SQDC website. See `Agent`.
+        :param checkpoint_dir: Where to keep the shard sessions, caches and checkpoints.
+        :param strain_store: Where to save the merged strains. Defaults to `out/strains.db`.
+        :param history: Where to record price and stock changes. Defaults to `out/history.db`.
+        """
+        self.shards = shards
+        self.rate_limit = rate_limit
+        self.store_workers = store_workers
+        self.checkpoint_dir = checkpoint_dir
+        # The stores that failed in the last sweep
+        self.failed: List[int] = []
+        self.__day = day
+        self.__month = month
+        self.__year = year
+        self.__base_url = base_url
+        self.__strain_store = strain_store or StrainStore()
+        self.__history = history or PriceHistory()
+
+    def run(
+        self,
+        store_ids: List[int],
+        filters: dict = None,
+        browserless: bool = True,
+        resume: bool = True,
+    ) -> Dict[Tuple[str, str], Strain]:
+        """
+        Sweeps the stores, saving each store's strains to the strain store as its shard completes.
+        :param store_ids: The stores to scan.
+        :param filters: The filters to apply to the SQDC website. See `Agent.build_filter_url` for more info.
+        :param browserless: Whether to resolve names and URLs over plain HTTP. See `Agent.run`.
+        :param resume: Whether to reuse the checkpoints of an interrupted sweep of the same stores and filters.
+        :return: The strains of every scanned store, deduplicated and keyed by (store ID, SKU).
+        Failed stores are left out, listed in `failed`, and retried on the next run.
+        """
+        # --- Step 1: Plan the shards, and load what an interrupted sweep finished --- #
+        plan = split_shards(list(store_ids), self.shards)
+        done = self.__load_checkpoints(plan, filters) if resume else {}
+        if not resume:
+            self.__reset(plan, filters)
+
+        # --- Step 2: Scan the remaining stores of each shard in its own process --- #
+        tasks = []
+        for index, shard in enumerate(plan):
+            pending = [store_id for store_id in shard if store_id not in done.get(index, {})]
+            if pending:
+                tasks.append((index, self.__make_task(index, pending, filters, browserless)))
+        skipped = sum(len(stores) for stores in done.values())
+        logger.info(
+            f"Sweeping {sum(len(task['store_ids']) for _, task in tasks):,} store(s) in "
+            f"{len(tasks):,} shard(s), {skipped:,} store(s) already done."
+        )
+
+        self.failed = []
+        if tasks:
+            log_queue = multiprocessing.Queue()
+            listener = Logger().receive(log_queue)
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=len(tasks), initializer=_init_worker, initargs=(log_queue,)
+                ) as executor:
+                    futures = {executor.submit(_scan_shard, task): index for index, task in tasks}
+                    for future in as_completed(futures):
+                        index = futures[future]
+                        try:
+                            results = future.result()
+                        except Exception as e:
+                            logger.error(f"Shard {index} failed: {e}")
+                            self.failed.extend(dict(tasks)[index]["store_ids"])
+                            continue
+
+                        finished = done.setdefault(index, {})
+                        for store_id, result in results.items():
+                            if isinstance(result, str):
+                                logger.error(f"Failed to scan store {store_id}: {result}")
+                                self.failed.append(store_id)
+                                continue
+                            self.__save(store_id, result)
+                            finished[store_id] = result
+                        self.__write_checkpoint(index, finished)
+                        logger.info(f"Shard {index}: {len(finished):,} store(s) done.")
+            finally:
+                # The workers have exited, so every record they sent is already queued
+                listener.stop()
+
+        # --- Step 3: Merge the shards --- #
+        merged = self.merge(
+            (store_id, strains)
+            for index in sorted(done)
+            for store_id, strains in done[index].items()
+        )
+        if self.failed:
+            logger.warning(
+                f"{len(self.failed):,} store(s) failed, run again to resume the sweep."
+            )
+        else:
+            self.__clear_checkpoints()
+        return merged
+
+    @staticmethod
+    def merge(results) -> Dict[Tuple[str, str], Strain]:
+        """
+        Merges scan results into a single dataset. When a SKU is seen twice in a store, the last one wins.
+        :param results: (store_id, strains) tuples.
+        :return: The processed strains, keyed by (store ID, SKU).
+        """
+        merged: Dict[Tuple[str, str], Strain] = {}
+        for store_id, strains in results:
+            for strain in strains:
+                if strain.is_processed:
+                    merged[(str(store_id), strain.sku)] = strain
+        return merged
+
+    def close(self) -> None:
+        self.__strain_store.close()
+        self.__history.close()
+
+    def __make_task(
+        self, index: int, store_ids: List[int], filters: dict, browserless: bool
+    ) -> dict:
+        return {
+            "day": self.__day,
+            "month": self.__month,
+            "year": self.__year,
+            "base_url": self.__base_url,
+            "directory": self.__shard_dir(index),
+            "store_ids": store_ids,
+            "filters": filters,
+            "browserless": browserless,
+            "rate_limit": self.rate_limit,
+            "store_workers": self.store_workers,
+            "log_level": logger.getEffectiveLevel(),
+        }
+
+    def __save(self, store_id: int, strains: List[Strain]) -> None:
+        """
+        Saves a store the same way `Agent.run` does, from the coordinating process only, so the worker
+        processes never write to the same databases.
+        """
+        self.__strain_store.save_many(
+            store_id,
+            [s for s in strains if s.is_processed],
+            in_stock=[s.sku for s in strains],
+        )
+        self.__history.record(store_id, strains)
+
+    def __shard_dir(self, index: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"shard-{index:03d}")
+
+    def __load_checkpoints(
+        self, plan: List[List[int]], filters: dict
+    ) -> Dict[int, Dict[int, List[Strain]]]:
+        """
+        :return: The finished stores of each shard, or nothing if the checkpoints are of another sweep.
+        """
+        plan_filepath = os.path.join(self.checkpoint_dir, "plan.json")
+        try:
+            with open(plan_filepath, "r") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = None
+        if previous != {"shards": plan, "filters": filters}:
+            if previous is not None:
+                logger.warning("Checkpoints are from a different sweep, starting over.")
+            self.__reset(plan, filters)
+            return {}
+
+        done: Dict[int, Dict[int, List[Strain]]] = {}
+        for index in range(len(plan)):
+            filepath = os.path.join(self.__shard_dir(index), "checkpoint.pkl")
+            if not os.path.exists(filepath):
+                continue
+            try:
+                with open(filepath, "rb") as f:
+                    done[index] = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                logger.warning(f"Could not read checkpoint `{filepath}`: {e}")
+        return done
+
+    def __reset(self, plan: List[List[int]], filters: dict) -> None:
+        """
+        Removes the checkpoints and writes the new plan.
+        """
+        self.__clear_checkpoints()
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        with open(os.path.join(self.checkpoint_dir, "plan.json"), "w") as f:
+            json.dump({"shards": plan, "filters": filters}, f)
+
+    def __clear_checkpoints(self) -> None:
+        """
+        Removes the plan and the checkpoints, but keeps the shard sessions and caches for the next sweep.
+        """
+        if not os.path.isdir(self.checkpoint_dir):
+            return
+        filepaths = [os.path.join(self.checkpoint_dir, "plan.json")] + [
+            os.path.join(self.checkpoint_dir, name, "checkpoint.pkl")
+            for name in os.listdir(self.checkpoint_dir)
+            if name.startswith("shard-")
+        ]
+        for filepath in filepaths:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def __write_checkpoint(self, index: int, finished: Dict[int, List[Strain]]) -> None:
+        directory = self.__shard_dir(index)
+        os.makedirs(directory, exist_ok=True)
+        filepath = os.path.join(directory, "checkpoint.pkl")
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint
+        tmp_filepath = f"{filepath}.tmp"
+        with open(tmp_filepath, "wb") as f:
+            pickle.dump(finished, f)
+        os.replace(tmp_filepath, filepath)
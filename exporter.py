@@ -0,0 +1,280 @@
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import os
+import sys
+import time
+from typing import Iterable, List, Tuple
+
+from history import COLUMNS as HISTORY_COLUMNS
+from history import PriceHistory
+from strain import Strain
+from strain_store import COLUMNS, StrainStore
+from utils.custom_logger import Logger
+
+logger = Logger().get_logger()
+
+FORMATS = ("csv", "jsonl", "parquet")
+FORMAT_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+# Text formats are compressed as a whole stream, Parquet compresses each column chunk itself
+STREAM_COMPRESSIONS = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+PARQUET_COMPRESSIONS = ("snappy", "gzip", "zstd", "brotli", "lz4", "none")
+
+# Parquet types of every exportable column, from the strain store and the history
+COLUMN_TYPES = {
+    "store_id": "string",
+    "sku": "string",
+    "name": "string",
+    "url": "string",
+    "list_price": "float64",
+    "display_price": "float64",
+    "quantity": "int64",
+    "promised_quantity": "int64",
+    "scanned_at": "float64",
+    "recorded_at": "float64",
+    "grams": "float64",
+}
+
+
+class Exporter:
+    def __init__(
+        self,
+        filepath: str,
+        columns: Tuple[str, ...] = COLUMNS,
+        fmt: str = None,
+        compression: str = None,
+        batch_size: int = 1000,
+    ):
+        """
+        Streams rows to a CSV, JSON Lines or Parquet file, one batch at a time.
+
+            with Exporter("out/strains.csv.gz", columns=("sku", "name", "display_price")) as exporter:
+                exporter.write_strains(store_id, strains)
+
+        :param filepath: The file to write, or "-" for stdout (CSV and JSON Lines only).
+        :param columns: The columns to write, in order. See `COLUMN_TYPES`.
+        :param fmt: One of `FORMATS`. Inferred from the file extension by default, e.g. `.jsonl.gz`.
+        :param compression: For CSV and JSON Lines, "gzip", "bz2" or "xz", inferred from the extension by default.
+        For Parquet, one of `PARQUET_COMPRESSIONS`, "snappy" by default.
+        :param batch_size: The number of rows buffered before they are written.
+        """
+        unknown = set(columns) - set(COLUMN_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(sorted(unknown))}")
+
+        self.filepath = filepath
+        self.columns = tuple(columns)
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.__batch: List[tuple] = []
+
+        stem, extension = os.path.splitext(filepath)
+        if extension in COMPRESSION_EXTENSIONS:
+            compression = compression or COMPRESSION_EXTENSIONS[extension]
+            extension = os.path.splitext(stem)[1]
+        self.fmt = fmt or FORMAT_EXTENSIONS.get(extension)
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unknown export format `{self.fmt}`. Use one of {FORMATS}.")
+
+        if self.fmt == "parquet":
+            self.__open_parquet(compression)
+        else:
+            self.__open_text(compression)
+
+    def write_rows(self, rows: Iterable[tuple]) -> int:
+        """
+        Writes rows, in the order of `columns`.
+        :param rows: Any iterable of row tuples, e.g. `StrainStore.rows`. Consumed lazily.
+        :return: The number of rows written.
+        """
+        count = 0
+        for row in rows:
+            self.__batch.append(row)
+            if len(self.__batch) >= self.batch_size:
+                self.flush()
+            count += 1
+        return count
+
+    def write_strains(
+        self, store_id: int, strains: Iterable[Strain], scanned_at: float = None
+    ) -> int:
+        """
+        Writes the processed strains of a scan, e.g. the result of `Agent.run`.
+        :param store_id: The store the strains were scanned in.
+        :param strains: The strains to write. Strains that are not fully processed are skipped.
+        :param scanned_at: The time of the scan, as a UNIX timestamp. Defaults to now.
+        :return: The number of rows written.
+        """
+        values = {"store_id": str(store_id), "scanned_at": scanned_at or time.time()}
+        getters = {
+            "sku": lambda s: s.sku,
+            "name": lambda s: s.name,
+            "url": lambda s: s.url,
+            "list_price": lambda s: s.list_price,
+            "display_price": lambda s: s.display_price,
+            "quantity": lambda s: s.quantity,
+            "promised_quantity": lambda s: s.quantity_to_promise,
+            "grams": lambda s: s.grams,
+        }
+        row_getters = [
+            getters.get(column, lambda s, column=column: values.get(column))
+            for column in self.columns
+        ]
+        return self.write_rows(
+            tuple(get(strain) for get in row_getters)
+            for strain in strains
+            if strain.is_processed
+        )
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows.
+        """
+        if not self.__batch:
+            return
+        if self.fmt == "parquet":
+            self.__write_parquet(self.__batch)
+        elif self.fmt == "csv":
+            self.__csv.writerows(self.__batch)
+        else:
+            self.__stream.writelines(
+                json.dumps(dict(zip(self.columns, row))) + "\n" for row in self.__batch
+            )
+        self.rows_written += len(self.__batch)
+        self.__batch = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.fmt == "parquet":
+            self.__parquet.close()
+        elif self.__stream is not sys.stdout:
+            self.__stream.close()
+        else:
+            self.__stream.flush()
+        logger.info(f"Exported {self.rows_written:,} rows to `{self.filepath}`.")
+
+    def __enter__(self) -> "Exporter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __open_text(self, compression: str) -> None:
+        if compression is not None and compression not in STREAM_COMPRESSIONS:
+            raise ValueError(
+                f"Unknown compression `{compression}`. Use one of {tuple(STREAM_COMPRESSIONS)}."
+            )
+        if self.filepath == "-":
+            if compression:
+                raise ValueError("Compressed exports need a file path.")
+            self.__stream = sys.stdout
+        else:
+            self.__makedirs()
+            opener = STREAM_COMPRESSIONS.get(compression, open)
+            self.__stream = opener(self.filepath, "wt", newline="")
+        if self.fmt == "csv":
+            self.__csv = csv.writer(self.__stream)
+            self.__csv.writerow(self.columns)
+
+    def __open_parquet(self, compression: str) -> None:
+        # Parquet is optional, so pyarrow is only needed for Parquet exports
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "Parquet exports need pyarrow. Install it with `pip install pyarrow`."
+            )
+        if self.filepath == "-":
+            raise ValueError("Parquet exports need a file path.")
+
+        compression = compression or "snappy"
+        if compression not in PARQUET_COMPRESSIONS:
+            raise ValueError(
+                f"Unknown Parquet compression `{compression}`. Use one of {PARQUET_COMPRESSIONS}."
+            )
+        self.__makedirs()
+        self.__pa = pa
+        self.__schema = pa.schema(
+            [(column, getattr(pa, COLUMN_TYPES[column])()) for column in self.columns]
+        )
+        self.__parquet = pq.ParquetWriter(
+            self.filepath, self.__schema, compression=compression
+        )
+
+    def __write_parquet(self, rows: List[tuple]) -> None:
+        pa = self.__pa
+        arrays = [
+            pa.array(values, type=field.type)
+            for values, field in zip(zip(*rows), self.__schema)
+        ]
+        self.__parquet.write_batch(pa.record_batch(arrays, schema=self.__schema))
+
+    def __makedirs(self) -> None:
+        directory = os.path.dirname(self.filepath)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+
+def _check_columns(columns: Tuple[str, ...], available: Tuple[str, ...]) -> None:
+    """
+    `Exporter` accepts the columns of both sources, so the columns are checked against the source
+    before the output is opened, rather than failing once the header is written.
+    :param columns: The columns to export.
+    :param available: The columns of the source.
+    """
+    unknown = set(columns) - set(available)
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(sorted(unknown))}")
+
+
+def export_strains(
+    store: StrainStore,
+    filepath: str,
+    store_ids: List[int] = None,
+    since: float = None,
+    columns: Tuple[str, ...] = COLUMNS,
+    **kwargs,
+) -> int:
+    """
+    Exports the latest state of the stored strains, streaming them from the strain store.
+    :param store: The strain store to read from.
+    :param filepath: The file to write. See `Exporter`.
+    :param store_ids: Only export strains from these stores. Defaults to every store.
+    :param since: Only export strains scanned at or after this UNIX timestamp.
+    :param columns: The columns to write, in order. See `COLUMNS`.
+    :param kwargs: Passed on to `Exporter`, e.g. `fmt` or `compression`.
+    :return: The number of rows written.
+    """
+    _check_columns(columns, COLUMNS)
+    with Exporter(filepath, columns=columns, **kwargs) as exporter:
+        for store_id in store_ids or [None]:
+            exporter.write_rows(store.rows(store_id=store_id, since=since, columns=columns))
+    return exporter.rows_written
+
+
+def export_history(
+    price_history: PriceHistory,
+    filepath: str,
+    store_ids: List[int] = None,
+    sku: str = None,
+    since: float = None,
+    columns: Tuple[str, ...] = HISTORY_COLUMNS,
+    **kwargs,
+) -> int:
+    """
+    Exports the recorded price and stock changes, oldest first, streaming them from the history.
+    See `export_strains` for the parameters.
+    :param sku: Only export the changes of this SKU.
+    :return: The number of rows written.
+    """
+    _check_columns(columns, HISTORY_COLUMNS)
+    with Exporter(filepath, columns=columns, **kwargs) as exporter:
+        for store_id in store_ids or [None]:
+            exporter.write_rows(
+                price_history.rows(store_id=store_id, sku=sku, since=since, columns=columns)
+            )
+    return exporter.rows_written
@@ -0,0 +1,131 @@
+import re
+from typing import Callable, List, Optional, Set, Tuple
+
+from utils.custom_logger import Logger
+
+logger = Logger().get_logger()
+
+# Keys understood by the SQDC website. See `Agent.build_filter_url`.
+ATTRIBUTE_KEYS = ("DominantSpecies", "ProductAccessibilityLookupValue", "Format")
+# Keys only understood locally
+NUMERIC_KEYS = ("MinPrice", "MaxPrice", "MinQuantity")
+
+
+def parse_prices(price: dict) -> Optional[Tuple[float, float]]:
+    """
+    Reads the prices of a `calculatePrices` entry. The first variant price is used if there is one,
+    otherwise the default price.
+    :param price: A `ProductPrices` entry from the SQDC API.
+    :return: The (display_price, list_price), or None if the entry has no usable price.
+    """
+    try:
+        if "VariantPrices" not in price or len(price["VariantPrices"]) == 0:
+            display_price = float(price["DisplayPrice"].replace("$", ""))
+            list_price = float(price["DefaultListPrice"].replace("$", ""))
+        else:
+            _v = price["VariantPrices"][0]
+            display_price = float(_v["DisplayPrice"].replace("$", ""))
+            list_price = float(_v["ListPrice"].replace("$", ""))
+    except (KeyError, AttributeError, TypeError, ValueError):
+        return None
+    return display_price, list_price
+
+
+# E.g. "3.5 g", "3,5 g", "28g" or "10 x 0.5 g"
+_FORMAT = re.compile(r"\s*(?:(\d+)\s*[x×]\s*)?(\d+(?:[.,]\d+)?)\s*g\s*", re.IGNORECASE)
+
+
+def parse_grams(value: str) -> Optional[float]:
+    """
+    Reads a `Format` value as a weight.
+    :param value: A format as listed on the SQDC website, e.g. "3.5 g" or "10 x 0.5 g" for packs.
+    :return: The total weight in grams, or None if the format is not a weight.
+    """
+    match = _FORMAT.fullmatch(value or "")
+    if match is None:
+        return None
+    count, grams = match.groups()
+    return int(count or 1) * float(grams.replace(",", "."))
+
+
+class FilterEngine:
+    def __init__(self, filters: dict = None, listing: Set[str] = None):
+        """
+        Evaluates website filters locally, against the inventory and price JSON of a store,
+        so a single unfiltered fetch can answer any number of filter combinations.
+        Besides the keys of `Agent.build_filter_url`, it understands:
+        - MinPrice / MaxPrice: bounds on the display price
+        - MinQuantity: the minimum available to promise quantity
+
+        Attribute keys (species, strength, format) are not in the inventory or price JSON, so they are
+        checked against the SKUs found on the listing filtered by them. See `listing_filters`.
+        :param filters: The filters to evaluate.
+        :param listing: The SKUs on the listing filtered by the attribute keys. Required if there are any.
+        """
+        self.filters = filters or {}
+        self.listing = listing
+        self.__checks: List[Callable[[dict, Optional[dict]], bool]] = [
+            self.__compile(key, value) for key, value in self.filters.items()
+        ]
+
+    @staticmethod
+    def listing_filters(filters: dict) -> dict:
+        """
+        :param filters: The filters to evaluate.
+        :return: The attribute filters only, for `Agent.build_filter_url`. Empty if there are none.
+        """
+        return {key: value for key, value in filters.items() if key in ATTRIBUTE_KEYS}
+
+    def matches(self, item: dict, price: dict = None) -> bool:
+        """
+        :param item: An `InventoryItems` entry.
+        :param price: The matching `ProductPrices` entry, if the item was priced.
+        :return: True if the item passes every filter.
+        """
+        return all(check(item, price) for check in self.__checks)
+
+    def __compile(self, key: str, value) -> Callable[[dict, Optional[dict]], bool]:
+        """
+        Builds the check of a single filter, so the filter values are only parsed once.
+        :param key: The filter key.
+        :param value: The filter value, or a list of accepted values.
+        :return: A function of (item, price) returning whether the filter passes.
+        """
+        values = set(value) if isinstance(value, list) else {value}
+
+        if key == "InStock":
+            # The inventory is the store's own, so only "in store" can be checked locally
+            if "in store" not in values:
+                return lambda item, price: True
+            return lambda item, price: (
+                item["Quantity"]["Quantity"] > 0
+                and item["Quantity"]["AvailableToPromiseQuantity"] > 0
+            )
+
+        if key == "MinQuantity":
+            minimum = int(value)
+            return lambda item, price: (
+                item["Quantity"]["AvailableToPromiseQuantity"] >= minimum
+            )
+
+        if key in ("MinPrice", "MaxPrice"):
+            bound = float(value)
+
+            def check_price(item: dict, price: Optional[dict]) -> bool:
+                prices = parse_prices(price) if price else None
+                if prices is None:
+                    return False
+                return prices[0] >= bound if key == "MinPrice" else prices[0] <= bound
+
+            return check_price
+
+        if key in ATTRIBUTE_KEYS:
+            if self.listing is None:
+                raise ValueError(
+                    f"`{key}` can only be evaluated against the filtered listing, pass `listing`."
+                )
+            # The listing applies every attribute key at once, so the check is the same for each key
+            listing = self.listing
+            return lambda item, price: item["Sku"] in listing
+
+        raise ValueError(f"Unknown filter `{key}`.")
@@ -0,0 +1,185 @@
+import time
+from typing import Iterator, List, Tuple
+
+from strain import Strain
+from utils.custom_logger import Logger
+from utils.sqlite_db import SQLiteDatabase
+
+logger = Logger().get_logger()
+
+# Columns that make up a snapshot of a strain, compared between scans
+TRACKED = ("display_price", "list_price", "quantity", "promised_quantity")
+# Columns of the history table, in order
+COLUMNS = ("recorded_at", "store_id", "sku", *TRACKED)
+
+
+class PriceHistory:
+    def __init__(self, filepath: str = "out/history.db"):
+        """
+        An append-only history of the price and stock of every strain, per store.
+        Only strains whose tracked values changed since the previous scan are written.
+        :param filepath: The SQLite database to store the history in.
+        """
+        self.__db = SQLiteDatabase(filepath)
+        with self.__db.connection:
+            self.__db.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS history (
+                    recorded_at REAL NOT NULL,
+                    store_id TEXT NOT NULL,
+                    sku TEXT NOT NULL,
+                    display_price REAL,
+                    list_price REAL,
+                    quantity INTEGER,
+                    promised_quantity INTEGER
+                )
+                """
+            )
+            self.__db.connection.execute(
+                "CREATE INDEX IF NOT EXISTS history_sku ON history (sku, recorded_at)"
+            )
+            self.__db.connection.execute(
+                "CREATE INDEX IF NOT EXISTS history_recorded_at ON history (recorded_at)"
+            )
+            # The last snapshot of every (store, sku), so diffs never scan the history
+            self.__db.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS latest (
+                    store_id TEXT NOT NULL,
+                    sku TEXT NOT NULL,
+                    display_price REAL,
+                    list_price REAL,
+                    quantity INTEGER,
+                    promised_quantity INTEGER,
+                    PRIMARY KEY (store_id, sku)
+                )
+                """
+            )
+
+    def record(
+        self, store_id: int, strains: List[Strain], recorded_at: float = None
+    ) -> int:
+        """
+        Records a scan of a store. Strains that disappeared since the previous scan are recorded as sold out.
+        :param store_id: The store the strains were scanned in.
+        :param strains: Every strain found in the store.
+        :param recorded_at: The time of the scan, as a UNIX timestamp. Defaults to now.
+        :return: The number of rows written.
+        """
+        recorded_at = recorded_at or time.time()
+        store_id = str(store_id)
+        current = {
+            s.sku: (s.display_price, s.list_price, s.quantity, s.quantity_to_promise)
+            for s in strains
+        }
+
+        with self.__db.lock, self.__db.connection:
+            previous = {
+                row[0]: tuple(row[1:])
+                for row in self.__db.connection.execute(
+                    f"SELECT sku, {', '.join(TRACKED)} FROM latest WHERE store_id = ?",
+                    (store_id,),
+                )
+            }
+
+            changed = {
+                sku: values
+                for sku, values in current.items()
+                if previous.get(sku) != values
+            }
+            # Sold out: keep the last known prices, with no stock left
+            for sku in previous.keys() - current.keys():
+                display_price, list_price, quantity, _ = previous[sku]
+                if quantity != 0:
+                    changed[sku] = (display_price, list_price, 0, 0)
+
+            self.__db.connection.executemany(
+                "INSERT INTO history VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(recorded_at, store_id, sku, *v) for sku, v in changed.items()],
+            )
+            self.__db.connection.executemany(
+                "INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?, ?, ?)",
+                [(store_id, sku, *v) for sku, v in changed.items()],
+            )
+
+        logger.info(
+            f"Recorded {len(changed):,} change(s) out of {len(current):,} strains in store {store_id}."
+        )
+        return len(changed)
+
+    def price_history(self, sku: str, store_id: int = None) -> List[tuple]:
+        """
+        Gets every recorded change of a SKU, oldest first.
+        :param sku: The SKU to look up.
+        :param store_id: Only return changes in this store.
+        :return: A list of (recorded_at, store_id, sku, display_price, list_price, quantity, promised_quantity).
+        """
+        query = "SELECT * FROM history WHERE sku = ?"
+        params = [sku]
+        if store_id is not None:
+            query += " AND store_id = ?"
+            params.append(str(store_id))
+        with self.__db.lock:
+            return self.__db.connection.execute(
+                query + " ORDER BY recorded_at", params
+            ).fetchall()
+
+    def changes_since(self, timestamp: float, store_id: int = None) -> List[tuple]:
+        """
+        Gets every change recorded after a given time, oldest first.
+        :param timestamp: The UNIX timestamp to start from, exclusive.
+        :param store_id: Only return changes in this store.
+        :return: A list of rows. See `price_history`.
+        """
+        query = "SELECT * FROM history WHERE recorded_at > ?"
+        params = [timestamp]
+        if store_id is not None:
+            query += " AND store_id = ?"
+            params.append(str(store_id))
+        with self.__db.lock:
+            return self.__db.connection.execute(
+                query + " ORDER BY recorded_at", params
+            ).fetchall()
+
+    def rows(
+        self,
+        store_id: int = None,
+        sku: str = None,
+        since: float = None,
+        columns: Tuple[str, ...] = COLUMNS,
+        batch_size: int = 1000,
+    ) -> Iterator[tuple]:
+        """
+        Iterates over the recorded changes matching the given criteria, oldest first.
+        Rows are read in batches, so a long history is never held in memory at once.
+        :param store_id: Only return changes in this store.
+        :param sku: Only return changes of this SKU.
+        :param since: Only return changes recorded after this UNIX timestamp, exclusive.
+        :param columns: The columns to return, in order. See `COLUMNS`.
+        :param batch_size: The number of rows read at a time.
+        :return: An iterator of row tuples.
+        """
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(sorted(unknown))}")
+
+        clauses, params = [], []
+        if store_id is not None:
+            clauses.append("store_id = ?")
+            params.append(str(store_id))
+        if sku is not None:
+            clauses.append("sku = ?")
+            params.append(sku)
+        if since is not None:
+            clauses.append("recorded_at > ?")
+            params.append(since)
+        # Rows are appended in time order, so the rowid doubles as the batch cursor
+        clauses.append("rowid > ?")
+        query = (
+            f"SELECT rowid, {', '.join(columns)} FROM history "
+            f"WHERE {' AND '.join(clauses)} ORDER BY rowid LIMIT {int(batch_size)}"
+        )
+        return self.__db.iter_batches(query, params, batch_size)
+
+    def close(self) -> None:
+        self.__db.close()
@@ -1,6 +1,7 @@
 import os
 
 from agent import Agent
+from ranking import RankingEngine
 from utils.custom_logger import Logger
 import logging
 from dotenv import load_dotenv
@@ -14,7 +15,8 @@ if __name__ == "__main__":
         "InStock": "in store",
         "DominantSpecies": ["Indica", "Sativa"],
         "ProductAccessibilityLookupValue": "3",  # Weed strength (1-3)
-        "Format": "3.5 g",
+        # Every format is resolved, so they can be compared per gram
+        "Format": ["3.5 g", "7 g", "15 g", "28 g"],
     }
 
     get_env = lambda period: int(os.getenv(period))
@@ -22,14 +24,17 @@ if __name__ == "__main__":
     agent = Agent(
         day=int(get_env("DAY")), month=int(get_env("MONTH")), year=int(get_env("YEAR"))
     )
-    strains = agent.run(store_id=get_env("STORE_ID"), filters=filters)
-    processed = [s for s in strains if s.is_processed]
-    processed.sort(key=lambda x: x.display_price)
+    store_id = get_env("STORE_ID")
+    strains = agent.run(store_id=store_id, filters=filters)
+    deals = RankingEngine(by="price_per_gram", k=20).rank(
+        (store_id, strain) for strain in strains
+    )
 
-    for strain in processed:
+    for deal in deals:
         print("---------------------------------")
-        print(f"NAME: {strain.name}")
-        print(f"PRICE: CAD ${strain.display_price}")
-        print(f"QTY: {strain.quantity_to_promise:,.0f} packets")
-        print(f"URL: {strain.url}")
+        print(f"NAME: {deal['name']}")
+        print(f"PRICE: CAD ${deal['display_price']} ({deal['grams']:g} g)")
+        print(f"PER GRAM: CAD ${deal['price_per_gram']:.2f}")
+        print(f"QTY: {deal['promised_quantity']:,.0f} packets")
+        print(f"URL: {deal['url']}")
         print("---------------------------------\n")
@@ -0,0 +1,106 @@
+import heapq
+from typing import Iterable, List, Tuple
+
+from strain import Strain
+
+RANK_KEYS = ("score", "price_per_gram", "discount", "display_price")
+# Keys where the lowest value is the best deal
+_ASCENDING = ("price_per_gram", "display_price")
+
+
+class RankingEngine:
+    def __init__(
+        self,
+        by: str = "score",
+        k: int = 10,
+        stock_weight: float = 5,
+        min_quantity: int = 0,
+        max_price: float = None,
+    ):
+        """
+        Ranks strains across formats and stores in a single pass, only ever holding the best `k` in a heap.
+        Each strain is measured on:
+        - price_per_gram: the display price divided by the weight of a packet. Lower is better.
+        - discount: how far the display price is below the list price, as a fraction of it. Higher is better.
+        - score: grams per dollar, raised by the discount and weighted by the stock left, so a bargain
+          with a single packet left ranks below a slightly pricier one that is well stocked.
+
+        :param by: The measure to rank by. See `RANK_KEYS`.
+        :param k: The number of strains to return.
+        :param stock_weight: The number of packets at which the stock weight of the score reaches one half.
+        :param min_quantity: Skip strains with fewer packets available.
+        :param max_price: Skip strains with a higher display price.
+        """
+        if by not in RANK_KEYS:
+            raise ValueError(f"Unknown ranking `{by}`. Use one of {RANK_KEYS}.")
+        self.by = by
+        self.k = k
+        self.stock_weight = stock_weight
+        self.min_quantity = min_quantity
+        self.max_price = max_price
+
+    def rank(self, strains: Iterable[Tuple[str, Strain]]) -> List[dict]:
+        """
+        Finds the best deals, e.g. among `StrainStore.query()` or the flattened result of `Agent.scan_stores`.
+        Strains that are not fully processed are skipped, as are strains of unknown weight unless ranking
+        by discount or display price.
+        :param strains: (store_id, strain) tuples.
+        :return: The `k` best deals, best first, as dicts of the strain's fields and its measures.
+        """
+        heap: List[tuple] = []
+        sign = -1 if self.by in _ASCENDING else 1
+        for position, (store_id, strain) in enumerate(strains):
+            measures = self.measure(strain)
+            if measures is None or measures[self.by] is None:
+                continue
+            # The position breaks ties, so strains themselves are never compared
+            entry = (sign * measures[self.by], -position, store_id, strain, measures)
+            if len(heap) < self.k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        return [
+            {
+                "store_id": store_id,
+                "sku": strain.sku,
+                "name": strain.name,
+                "url": strain.url,
+                "display_price": strain.display_price,
+                "list_price": strain.list_price,
+                "grams": strain.grams,
+                "promised_quantity": strain.quantity_to_promise,
+                **measures,
+            }
+            for _, _, store_id, strain, measures in sorted(heap, reverse=True)
+        ]
+
+    def measure(self, strain: Strain):
+        """
+        :param strain: The strain to measure.
+        :return: The price_per_gram, discount and score of the strain, or None if it is filtered out.
+        Measures that cannot be computed, e.g. for an unknown weight, are None.
+        """
+        if not strain.is_processed or strain.quantity_to_promise < self.min_quantity:
+            return None
+        if self.max_price is not None and strain.display_price > self.max_price:
+            return None
+
+        discount = None
+        if strain.list_price:
+            discount = 1 - strain.display_price / strain.list_price
+        price_per_gram = strain.price_per_gram
+        score = None
+        if price_per_gram:
+            stock = strain.quantity_to_promise
+            score = (
+                (1 / price_per_gram)
+                * (1 + max(discount or 0, 0))
+                * (stock / (stock + self.stock_weight))
+            )
+        return {
+            "price_per_gram": price_per_gram,
+            "discount": discount,
+            "score": score,
+            "display_price": strain.display_price,
+        }
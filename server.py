@@ -0,0 +1,120 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+
+from filters import parse_grams
+from strain_index import StrainIndex
+from strain_store import StrainStore
+from utils.custom_logger import Logger
+
+logger = Logger().get_logger()
+
+
+class QueryServer:
+    def __init__(
+        self,
+        store: StrainStore = None,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        refresh_interval: float = 5,
+    ):
+        """
+        Serves the stored strains over a local JSON API, from in-memory indexes.
+        The indexes are refreshed in the background from the strain store, so scans
+        running in another thread or process show up without blocking reads.
+
+        Routes:
+        - GET /stores/{store_id}/cheapest?n=10&max_price=30&min_quantity=1&format=3.5 g (or grams=3.5)
+        - GET /skus/{sku}/stores
+        - GET /health
+
+        :param store: The strain store to serve. Defaults to `out/strains.db`.
+        :param host: The address to listen on.
+        :param port: The port to listen on.
+        :param refresh_interval: How often the indexes are refreshed, in seconds.
+        """
+        self.store = store or StrainStore()
+        self.index = StrainIndex()
+        self.refresh_interval = refresh_interval
+        self.__stop = threading.Event()
+        self.__httpd = ThreadingHTTPServer((host, port), self.__handler())
+
+    def serve_forever(self) -> None:
+        """
+        Refreshes the indexes in the background and serves requests until interrupted.
+        """
+        self.index.refresh(self.store)
+        threading.Thread(target=self.__refresh_loop, daemon=True).start()
+        host, port = self.__httpd.server_address[:2]
+        logger.info(f"Serving strains on http://{host}:{port}")
+        try:
+            self.__httpd.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Interrupted, stopping server...")
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        self.__stop.set()
+        self.__httpd.server_close()
+
+    def __refresh_loop(self) -> None:
+        while not self.__stop.wait(self.refresh_interval):
+            try:
+                self.index.refresh(self.store)
+            except Exception as e:
+                logger.error(f"Failed to refresh the index: {e}")
+
+    def __handler(self):
+        index = self.index
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = [p for p in url.path.split("/") if p]
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                try:
+                    status, body = route(parts, query)
+                except ValueError as e:
+                    status, body = 400, {"error": str(e)}
+                self.__send(status, body)
+
+            def __send(self, status: int, body) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug(f"{self.address_string()} - {format % args}")
+
+        def route(parts: list, query: dict) -> Tuple[int, object]:
+            if parts == ["health"]:
+                return 200, {"stores": sorted(index.stores)}
+            if len(parts) == 3 and parts[0] == "stores" and parts[2] == "cheapest":
+                max_price = query.get("max_price")
+                grams = query.get("grams")
+                if "format" in query:
+                    grams = parse_grams(query["format"])
+                    if grams is None:
+                        raise ValueError(f"`{query['format']}` is not a format by weight.")
+                return 200, index.cheapest(
+                    parts[1],
+                    n=int(query.get("n", 10)),
+                    max_price=float(max_price) if max_price is not None else None,
+                    min_quantity=int(query.get("min_quantity", 0)),
+                    grams=float(grams) if grams is not None else None,
+                )
+            if len(parts) == 3 and parts[0] == "skus" and parts[2] == "stores":
+                return 200, index.stores_for_sku(parts[1])
+            return 404, {"error": "Not found"}
+
+        return Handler
+
+
+if __name__ == "__main__":
+    QueryServer().serve_forever()
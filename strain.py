@@ -7,6 +7,17 @@ logger = Logger().get_logger()
 
 
 class Strain:
+    __slots__ = (
+        "__sku",
+        "__name",
+        "__list_price",
+        "__display_price",
+        "__quantity",
+        "__quantity_to_promise",
+        "__url",
+        "__grams",
+    )
+
     def __init__(
         self,
         sku: str,
@@ -16,6 +27,7 @@ class Strain:
         quantity: int = None,
         promised_quantity: int = None,
         url: str = None,
+        grams: float = None,
     ):
         """
         :param sku: The SKU of the strain
@@ -25,6 +37,7 @@ class Strain:
         :param quantity: The quantity of the strain
         :param promised_quantity: The available to promise quantity of the strain
         :param url: The URL of the strain
+        :param grams: The weight of a packet, in grams. See `filters.parse_grams`.
         """
         self.__sku = sku
         self.__name = name
@@ -33,6 +46,7 @@ class Strain:
         self.__quantity = quantity
         self.__quantity_to_promise = promised_quantity
         self.__url = url
+        self.__grams = grams
 
     @staticmethod
     def load(directory: str, filename: str):
@@ -54,7 +68,8 @@ class Strain:
         # Base case: if directory does not exist, create it
         if not os.path.exists(directory):
             logger.debug(f"Directory `{directory}` does not exist. Creating it...")
-            os.makedirs(directory)
+            # Concurrent store scans may race to create it
+            os.makedirs(directory, exist_ok=True)
         filename: str = f"{self.name}.weed"
         filepath: str = os.path.join(directory, filename)
         with open(filepath, "wb") as f:
@@ -65,7 +80,18 @@ class Strain:
         """
         :return: Returns true if all the instance variables have been assigned.
         """
-        return not any(x is None for x in self.__dict__.values())
+        return not any(
+            x is None
+            for x in (
+                self.__sku,
+                self.__name,
+                self.__list_price,
+                self.__display_price,
+                self.__quantity,
+                self.__quantity_to_promise,
+                self.__url,
+            )
+        )
 
     @property
     def sku(self):
@@ -129,5 +155,34 @@ class Strain:
     def quantity_to_promise(self, value):
         self.__quantity_to_promise = value
 
+    @property
+    def grams(self):
+        return self.__grams
+
+    @grams.setter
+    def grams(self, value):
+        self.__grams = value
+
+    @property
+    def price_per_gram(self):
+        """
+        :return: The display price divided by the weight, or None if either is unknown.
+        """
+        if not self.__grams or self.__display_price is None:
+            return None
+        return self.__display_price / self.__grams
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled strain. Pickles written before `__slots__` was introduced hold a plain `__dict__`.
+        :param state: The pickled state, either a dict or a (dict, slots dict) tuple.
+        """
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        # Pickles written before the weight was parsed do not have it
+        self.__grams = None
+        for key, value in state.items():
+            setattr(self, key, value)
+
     def __str__(self):
         return f"Name: {self.name}\nSKU: ({self.sku})"
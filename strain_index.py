@@ -0,0 +1,126 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from strain_store import StrainStore
+from utils.custom_logger import Logger
+
+logger = Logger().get_logger()
+
+INDEX_COLUMNS = (
+    "store_id",
+    "sku",
+    "name",
+    "url",
+    "list_price",
+    "display_price",
+    "quantity",
+    "promised_quantity",
+    "scanned_at",
+    "grams",
+)
+
+
+class StrainIndex:
+    def __init__(self):
+        """
+        In-memory indexes over the stored strains, by store (sorted by price) and by SKU.
+        Writers rebuild the affected store and swap it in, so readers never take a lock.
+        """
+        # The strains of each store sorted by price, along with their prices, swapped in together
+        self.__by_store: Dict[str, Tuple[List[dict], List[float]]] = {}
+        self.__by_sku: Dict[str, Dict[str, dict]] = {}
+        self.__version: Optional[int] = None
+        self.__lock = threading.Lock()
+
+    def refresh(self, store: StrainStore) -> int:
+        """
+        Rebuilds the stores written since the last refresh from all of their stored strains, so strains
+        kept from an earlier scan stay indexed, and sold out ones are dropped.
+        Writes are tracked by their version rather than their scan time, which is taken before the write
+        and can be older than a write committed in the meantime. See `StrainStore.versions`.
+        :param store: The strain store to read from.
+        :return: The number of stores updated.
+        """
+        with self.__lock:
+            written = store.versions(after=self.__version)
+            for store_id in written:
+                entries = [
+                    dict(zip(INDEX_COLUMNS, row))
+                    for row in store.rows(store_id=store_id, columns=INDEX_COLUMNS)
+                ]
+                self.__update_store(store_id, entries)
+
+            if written:
+                # A write committed while the stores were read is picked up again on the next refresh
+                self.__version = max(written.values())
+                logger.debug(f"Index refreshed for {len(written):,} store(s).")
+            return len(written)
+
+    def __update_store(self, store_id: str, entries: List[dict]) -> None:
+        """
+        Replaces every indexed strain of a store. Stores left without strains are dropped.
+        :param store_id: The store to replace.
+        :param entries: Every stored strain of the store, as dicts.
+        """
+        entries = sorted(entries, key=lambda e: e["display_price"])
+        prices = [e["display_price"] for e in entries]
+
+        by_sku = dict(self.__by_sku)
+        for sku in {e["sku"] for e in self.__by_store.get(store_id, ([], []))[0]}:
+            stores = dict(by_sku[sku])
+            stores.pop(store_id, None)
+            if stores:
+                by_sku[sku] = stores
+            else:
+                del by_sku[sku]
+        for entry in entries:
+            by_sku[entry["sku"]] = {**by_sku.get(entry["sku"], {}), store_id: entry}
+
+        # Swap in the new structures; readers see either the old or the new state
+        by_store = {**self.__by_store, store_id: (entries, prices)}
+        if not entries:
+            del by_store[store_id]
+        self.__by_store = by_store
+        self.__by_sku = by_sku
+
+    def cheapest(
+        self,
+        store_id,
+        n: int = 10,
+        max_price: float = None,
+        min_quantity: int = 0,
+        grams: float = None,
+    ) -> List[dict]:
+        """
+        :param store_id: The store to look in.
+        :param n: The number of strains to return.
+        :param max_price: Only return strains at or below this display price.
+        :param min_quantity: Only return strains with at least this many packets available.
+        :param grams: Only return strains of this format, by the weight of a packet. See `filters.parse_grams`.
+        :return: The `n` cheapest strains of the store.
+        """
+        entries, prices = self.__by_store.get(str(store_id), ([], []))
+        if max_price is not None:
+            entries = entries[: bisect.bisect_right(prices, max_price)]
+        if min_quantity:
+            entries = (e for e in entries if e["promised_quantity"] >= min_quantity)
+        if grams is not None:
+            entries = (e for e in entries if e["grams"] == grams)
+        result = []
+        for entry in entries:
+            if len(result) >= n:
+                break
+            result.append(entry)
+        return result
+
+    def stores_for_sku(self, sku: str) -> Dict[str, dict]:
+        """
+        :param sku: The SKU to look up.
+        :return: The strain in every store stocking the SKU, keyed by store ID.
+        """
+        return self.__by_sku.get(sku, {})
+
+    @property
+    def stores(self) -> Set[str]:
+        return set(self.__by_store)
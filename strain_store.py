@@ -0,0 +1,264 @@
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from strain import Strain
+from utils.custom_logger import Logger
+from utils.sqlite_db import SQLiteDatabase
+
+logger = Logger().get_logger()
+
+COLUMNS = (
+    "store_id",
+    "sku",
+    "name",
+    "url",
+    "list_price",
+    "display_price",
+    "quantity",
+    "promised_quantity",
+    "scanned_at",
+    "grams",
+)
+
+
+class StrainStore:
+    def __init__(self, filepath: str = "out/strains.db"):
+        """
+        Stores the latest state of every strain, per store, in a single SQLite database.
+        :param filepath: The SQLite database to store the strains in.
+        """
+        self.filepath = filepath
+        self.__db = SQLiteDatabase(filepath)
+        with self.__db.connection:
+            self.__db.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS strains (
+                    store_id TEXT NOT NULL,
+                    sku TEXT NOT NULL,
+                    name TEXT,
+                    url TEXT,
+                    list_price REAL,
+                    display_price REAL,
+                    quantity INTEGER,
+                    promised_quantity INTEGER,
+                    scanned_at REAL NOT NULL,
+                    grams REAL,
+                    PRIMARY KEY (store_id, sku)
+                )
+                """
+            )
+            # Stores created before the weight was parsed
+            existing = {
+                row[1] for row in self.__db.connection.execute("PRAGMA table_info(strains)")
+            }
+            if "grams" not in existing:
+                self.__db.connection.execute("ALTER TABLE strains ADD COLUMN grams REAL")
+            # A single counter bumped by every write, and the last write to each store. See `__write`.
+            self.__db.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sequence (version INTEGER NOT NULL)"
+            )
+            self.__db.connection.execute(
+                "INSERT INTO sequence SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM sequence)"
+            )
+            self.__db.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stores (
+                    store_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+                """
+            )
+            self.__db.connection.execute(
+                "INSERT OR IGNORE INTO stores SELECT DISTINCT store_id, 0 FROM strains"
+            )
+            self.__db.connection.execute(
+                "CREATE INDEX IF NOT EXISTS strains_sku ON strains (sku)"
+            )
+            self.__db.connection.execute(
+                "CREATE INDEX IF NOT EXISTS strains_scanned_at ON strains (scanned_at)"
+            )
+
+    def save_many(
+        self,
+        store_id: int,
+        strains: List[Strain],
+        scanned_at: float = None,
+        in_stock: Iterable[str] = None,
+    ) -> None:
+        """
+        Saves the strains of a store in a single transaction, replacing their previous state.
+        :param store_id: The store the strains were scanned in.
+        :param strains: The strains to save.
+        :param scanned_at: The time of the scan, as a UNIX timestamp. Defaults to now.
+        :param in_stock: Every SKU in stock at the store, saved or not. If given, the store's strains that
+        are not in it have sold out, and are removed. Their last state stays in `history.PriceHistory`.
+        """
+        scanned_at = scanned_at or time.time()
+        sold_out = self.__write(
+            [self.__to_row(store_id, s, scanned_at) for s in strains],
+            store_id=None if in_stock is None else str(store_id),
+            in_stock=None if in_stock is None else set(in_stock) | {s.sku for s in strains},
+        )
+        logger.debug(
+            f"Saved {len(strains):,} strains for store {store_id}, removed {sold_out:,} sold out."
+        )
+
+    def rows(
+        self,
+        store_id: int = None,
+        sku: str = None,
+        since: float = None,
+        columns: Tuple[str, ...] = COLUMNS,
+        batch_size: int = 1000,
+    ) -> Iterator[tuple]:
+        """
+        Iterates over the stored rows matching the given criteria, without building `Strain` objects.
+        Rows are read in batches, so large stores are never held in memory at once.
+        :param store_id: Only return strains from this store.
+        :param sku: Only return this SKU.
+        :param since: Only return strains scanned at or after this UNIX timestamp.
+        :param columns: The columns to return, in order. See `COLUMNS`.
+        :param batch_size: The number of rows read at a time.
+        :return: An iterator of row tuples.
+        """
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(sorted(unknown))}")
+
+        clauses, params = [], []
+        if store_id is not None:
+            clauses.append("store_id = ?")
+            params.append(str(store_id))
+        if sku is not None:
+            clauses.append("sku = ?")
+            params.append(sku)
+        if since is not None:
+            clauses.append("scanned_at >= ?")
+            params.append(since)
+        # Batches are keyed on the rowid, so the lock is only held while a batch is read
+        clauses.append("rowid > ?")
+        query = (
+            f"SELECT rowid, {', '.join(columns)} FROM strains "
+            f"WHERE {' AND '.join(clauses)} ORDER BY rowid LIMIT {int(batch_size)}"
+        )
+        return self.__db.iter_batches(query, params, batch_size)
+
+    def versions(self, after: int = None) -> Dict[str, int]:
+        """
+        :param after: Only return the stores written after this version.
+        :return: The version of the last write to each store, keyed by store ID. Writes that only removed
+        sold out strains count too.
+        """
+        query, params = "SELECT store_id, version FROM stores", []
+        if after is not None:
+            query += " WHERE version > ?"
+            params.append(after)
+        with self.__db.lock:
+            return dict(self.__db.connection.execute(query, params).fetchall())
+
+    def query(
+        self, store_id: int = None, sku: str = None, since: float = None
+    ) -> List[Tuple[str, Strain]]:
+        """
+        Loads the stored strains matching the given criteria. See `rows` for the parameters.
+        :return: A list of (store_id, strain) tuples.
+        """
+        return [
+            (
+                row[0],
+                Strain(
+                    sku=row[1],
+                    name=row[2],
+                    url=row[3],
+                    list_price=row[4],
+                    display_price=row[5],
+                    quantity=row[6],
+                    promised_quantity=row[7],
+                    grams=row[9],
+                ),
+            )
+            for row in self.rows(store_id=store_id, sku=sku, since=since)
+        ]
+
+    def import_pickles(self, directory: str, store_id: Optional[int] = None) -> int:
+        """
+        Imports the `.weed` pickle files written by `Strain.save`.
+        :param directory: The directory holding the pickle files.
+        :param store_id: The store the strains were scanned in. Pickles do not record it.
+        :return: The number of strains imported.
+        """
+        rows = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".weed"):
+                continue
+            try:
+                strain = Strain.load(directory, filename)
+            except Exception as e:
+                logger.warning(f"Could not load `{filename}`: {e}")
+                continue
+            scanned_at = os.path.getmtime(os.path.join(directory, filename))
+            rows.append(
+                self.__to_row("" if store_id is None else store_id, strain, scanned_at)
+            )
+
+        self.__write(rows)
+        logger.info(f"Imported {len(rows):,} strains from `{directory}`.")
+        return len(rows)
+
+    def __write(
+        self, rows: List[tuple], store_id: str = None, in_stock: Set[str] = None
+    ) -> int:
+        """
+        Upserts rows in a single transaction. The stores written are stamped with the next version while
+        the database is locked for writing, so versions follow the order in which writes are committed.
+        See `versions`.
+        :param rows: Row tuples, in the order of `COLUMNS`.
+        :param store_id: If given with `in_stock`, the store whose other rows are removed.
+        :param in_stock: The SKUs of the store to keep.
+        :return: The number of rows removed.
+        """
+        with self.__db.lock, self.__db.connection:
+            self.__db.connection.execute("UPDATE sequence SET version = version + 1")
+            (version,) = self.__db.connection.execute("SELECT version FROM sequence").fetchone()
+            sold_out = []
+            if store_id is not None and in_stock is not None:
+                sold_out = [
+                    (store_id, sku)
+                    for (sku,) in self.__db.connection.execute(
+                        "SELECT sku FROM strains WHERE store_id = ?", (store_id,)
+                    )
+                    if sku not in in_stock
+                ]
+                self.__db.connection.executemany(
+                    "DELETE FROM strains WHERE store_id = ? AND sku = ?", sold_out
+                )
+            self.__db.connection.executemany(
+                f"INSERT OR REPLACE INTO strains ({', '.join(COLUMNS)}) "
+                f"VALUES ({','.join('?' * len(COLUMNS))})",
+                rows,
+            )
+            stores = {row[0] for row in rows} | ({store_id} if store_id is not None else set())
+            self.__db.connection.executemany(
+                "INSERT OR REPLACE INTO stores VALUES (?, ?)",
+                [(s, version) for s in stores],
+            )
+        return len(sold_out)
+
+    @staticmethod
+    def __to_row(store_id, strain: Strain, scanned_at: float) -> tuple:
+        return (
+            str(store_id),
+            strain.sku,
+            strain.name,
+            strain.url,
+            strain.list_price,
+            strain.display_price,
+            strain.quantity,
+            strain.quantity_to_promise,
+            scanned_at,
+            strain.grams,
+        )
+
+    def close(self) -> None:
+        self.__db.close()
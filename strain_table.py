@@ -0,0 +1,272 @@
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from strain import Strain
+from strain_store import StrainStore
+
+# `price_per_gram` is derived from the display price and the weight
+NUMERIC_COLUMNS = (
+    "list_price",
+    "display_price",
+    "quantity",
+    "promised_quantity",
+    "grams",
+    "price_per_gram",
+)
+# The strain store columns a table is built from, in order. See `from_rows`.
+TABLE_COLUMNS = (
+    "store_id",
+    "sku",
+    "name",
+    "url",
+    "list_price",
+    "display_price",
+    "quantity",
+    "promised_quantity",
+    "grams",
+)
+
+
+class StrainTable:
+    def __init__(
+        self,
+        store_ids: np.ndarray,
+        skus: np.ndarray,
+        names: np.ndarray,
+        urls: np.ndarray,
+        list_price: np.ndarray,
+        display_price: np.ndarray,
+        quantity: np.ndarray,
+        promised_quantity: np.ndarray,
+        grams: np.ndarray,
+    ):
+        """
+        A column-oriented collection of strains, with the numeric columns held in contiguous NumPy arrays.
+        Missing prices and weights are stored as NaN, and missing quantities as -1.
+        Use `from_strains` or `from_rows` rather than building one by hand.
+        """
+        self.store_ids = store_ids
+        self.skus = skus
+        self.names = names
+        self.urls = urls
+        self.list_price = list_price
+        self.display_price = display_price
+        self.quantity = quantity
+        self.promised_quantity = promised_quantity
+        self.grams = grams
+
+    @classmethod
+    def from_strains(cls, strains: Iterable[Strain], store_id=None) -> "StrainTable":
+        """
+        Builds a table from strain objects.
+        :param strains: The strains to add.
+        :param store_id: The store the strains were scanned in, if known.
+        :return: The table.
+        """
+        return cls.from_rows(
+            (
+                store_id,
+                s.sku,
+                s.name,
+                s.url,
+                s.list_price,
+                s.display_price,
+                s.quantity,
+                s.quantity_to_promise,
+                s.grams,
+            )
+            for s in strains
+        )
+
+    @classmethod
+    def from_store(cls, store: StrainStore, store_id=None) -> "StrainTable":
+        """
+        Loads the stored strains, without building `Strain` objects.
+        :param store: The strain store to read from.
+        :param store_id: Only load strains from this store. Defaults to every store.
+        :return: The table.
+        """
+        return cls.from_rows(store.rows(store_id=store_id, columns=TABLE_COLUMNS))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "StrainTable":
+        """
+        Builds a table from row tuples, as returned by `StrainStore.rows(columns=TABLE_COLUMNS)`.
+        :param rows: Tuples of the `TABLE_COLUMNS`. Any extra trailing columns are ignored.
+        :return: The table.
+        """
+        rows = [row[: len(TABLE_COLUMNS)] for row in rows]
+        columns = list(zip(*rows)) if rows else [()] * len(TABLE_COLUMNS)
+
+        def _prices(values):
+            return np.array(
+                [np.nan if v is None else v for v in values], dtype=np.float64
+            )
+
+        def _quantities(values):
+            return np.array([-1 if v is None else v for v in values], dtype=np.int64)
+
+        return cls(
+            store_ids=np.array(columns[0], dtype=object),
+            skus=np.array(columns[1], dtype=object),
+            names=np.array(columns[2], dtype=object),
+            urls=np.array(columns[3], dtype=object),
+            list_price=_prices(columns[4]),
+            display_price=_prices(columns[5]),
+            quantity=_quantities(columns[6]),
+            promised_quantity=_quantities(columns[7]),
+            grams=_prices(columns[8]),
+        )
+
+    @classmethod
+    def concat(cls, tables: List["StrainTable"]) -> "StrainTable":
+        """
+        Joins several tables, e.g. from several stores or runs, into one.
+        :param tables: The tables to join.
+        :return: The joined table.
+        """
+        if not tables:
+            return cls.from_rows([])
+        return cls(
+            **{
+                column: np.concatenate([getattr(t, column) for t in tables])
+                for column in cls.__columns()
+            }
+        )
+
+    def __len__(self) -> int:
+        return len(self.skus)
+
+    def take(self, index: np.ndarray) -> "StrainTable":
+        """
+        Selects rows by a boolean mask or an array of positions.
+        :param index: The mask or positions.
+        :return: A new table with the selected rows.
+        """
+        return StrainTable(
+            **{column: getattr(self, column)[index] for column in self.__columns()}
+        )
+
+    @property
+    def processed(self) -> np.ndarray:
+        """
+        :return: A mask of the rows with every value set. See `Strain.is_processed`.
+        """
+        mask = ~np.isnan(self.list_price) & ~np.isnan(self.display_price)
+        mask &= (self.quantity >= 0) & (self.promised_quantity >= 0)
+        mask &= np.array([n is not None for n in self.names], dtype=bool)
+        mask &= np.array([u is not None for u in self.urls], dtype=bool)
+        return mask
+
+    def in_stock(self, min_quantity: int = 1) -> "StrainTable":
+        """
+        :param min_quantity: The minimum available to promise quantity.
+        :return: The rows with at least `min_quantity` packets available.
+        """
+        return self.take(self.promised_quantity >= min_quantity)
+
+    @property
+    def price_per_gram(self) -> np.ndarray:
+        """
+        :return: The display price divided by the weight of each row, NaN if either is unknown.
+        See `Strain.price_per_gram`.
+        """
+        grams = np.where(self.grams > 0, self.grams, np.nan)
+        return self.display_price / grams
+
+    def cheapest_per_gram(self, n: int, min_quantity: int = 1) -> "StrainTable":
+        """
+        :param n: The number of rows to return.
+        :param min_quantity: The minimum available to promise quantity.
+        :return: The `n` in-stock rows of known weight with the lowest price per gram, sorted.
+        """
+        table = self.take((self.promised_quantity >= min_quantity) & ~np.isnan(self.price_per_gram))
+        return table.cheapest(n, column="price_per_gram")
+
+    def sort(self, column: str = "display_price", descending: bool = False) -> "StrainTable":
+        """
+        :param column: The numeric column to sort by. See `NUMERIC_COLUMNS`.
+        :param descending: Whether to sort from highest to lowest.
+        :return: A new, sorted table. Missing values are always last.
+        """
+        values = self.__numeric(column)
+        order = np.argsort(-values if descending else values, kind="stable")
+        return self.take(order)
+
+    def rank(self, column: str = "display_price") -> np.ndarray:
+        """
+        :param column: The numeric column to rank by.
+        :return: The 0-based rank of each row, lowest value first.
+        """
+        ranks = np.empty(len(self), dtype=np.int64)
+        ranks[np.argsort(self.__numeric(column), kind="stable")] = np.arange(len(self))
+        return ranks
+
+    def cheapest(self, n: int, column: str = "display_price") -> "StrainTable":
+        """
+        Selects the `n` lowest rows without sorting the whole table.
+        :param n: The number of rows to return.
+        :param column: The numeric column to compare.
+        :return: The `n` cheapest rows, sorted.
+        """
+        values = self.__numeric(column)
+        if n < len(self):
+            index = np.argpartition(values, n)[:n]
+        else:
+            index = np.arange(len(self))
+        return self.take(index[np.argsort(values[index], kind="stable")])
+
+    def rows(self) -> Iterable[Tuple]:
+        """
+        :return: An iterator of tuples of the `TABLE_COLUMNS`.
+        """
+        return zip(*(getattr(self, column).tolist() for column in self.__columns()))
+
+    def to_strains(self) -> List[Tuple[Optional[str], Strain]]:
+        """
+        :return: A list of (store_id, strain) tuples.
+        """
+        return [
+            (
+                row[0],
+                Strain(
+                    sku=row[1],
+                    name=row[2],
+                    url=row[3],
+                    list_price=None if np.isnan(row[4]) else row[4],
+                    display_price=None if np.isnan(row[5]) else row[5],
+                    quantity=None if row[6] < 0 else row[6],
+                    promised_quantity=None if row[7] < 0 else row[7],
+                    grams=None if np.isnan(row[8]) else row[8],
+                ),
+            )
+            for row in self.rows()
+        ]
+
+    def __numeric(self, column: str) -> np.ndarray:
+        """
+        :return: The column as floats, with missing values as NaN so they sort last.
+        """
+        if column not in NUMERIC_COLUMNS:
+            raise ValueError(f"`{column}` is not a numeric column.")
+        if column == "price_per_gram":
+            return self.price_per_gram
+        values = getattr(self, column).astype(np.float64)
+        if column in ("quantity", "promised_quantity"):
+            values[values < 0] = np.nan
+        return values
+
+    @staticmethod
+    def __columns() -> Tuple[str, ...]:
+        return (
+            "store_ids",
+            "skus",
+            "names",
+            "urls",
+            "list_price",
+            "display_price",
+            "quantity",
+            "promised_quantity",
+            "grams",
+        )
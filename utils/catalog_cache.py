@@ -0,0 +1,81 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.custom_logger import Logger
+from utils.sqlite_db import SQLiteDatabase
+
+logger = Logger().get_logger()
+
+
+class CatalogCache:
+    def __init__(self, filepath: str = "out/catalog.db", ttl: int = 7 * 24 * 3600):
+        """
+        Persists which SKUs appear on a filtered listing, with their name and URL, so known SKUs skip pagination.
+        SKUs that were in stock but missing from a fully walked listing are remembered too, as they do not
+        match its filters. Entries are keyed by listing URL, and shared by all stores.
+        :param filepath: The SQLite database to store the catalog in.
+        :param ttl: How long an entry stays valid, in seconds.
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self.__db = SQLiteDatabase(filepath)
+        with self.__db.connection:
+            self.__db.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS listings (
+                    listing TEXT NOT NULL,
+                    sku TEXT NOT NULL,
+                    name TEXT,
+                    url TEXT,
+                    seen_at REAL NOT NULL,
+                    PRIMARY KEY (listing, sku)
+                )
+                """
+            )
+
+    def get_many(
+        self, listing: str, skus: List[str]
+    ) -> Dict[str, Optional[Tuple[str, str]]]:
+        """
+        Looks up the given SKUs on a listing. Stale entries count as misses.
+        :param listing: The filtered listing URL. See `Agent.build_filter_url`.
+        :param skus: The SKUs to look up.
+        :return: A {sku: (name, url)} mapping of the fresh entries found, with None for SKUs known
+        not to be on the listing.
+        """
+        found: Dict[str, Optional[Tuple[str, str]]] = {}
+        with self.__db.lock:
+            rows = self.__db.select_in(
+                "SELECT sku, name, url FROM listings WHERE listing = ? AND seen_at > ? AND sku IN ({})",
+                [listing, time.time() - self.ttl],
+                skus,
+            )
+            found.update((sku, None if name is None else (name, url)) for sku, name, url in rows)
+            self.hits += len(found)
+            self.misses += len(skus) - len(found)
+
+        return found
+
+    def put_many(self, listing: str, entries: Dict[str, Optional[Tuple[str, str]]]) -> None:
+        """
+        Caches listing entries, then evicts expired ones.
+        :param listing: The filtered listing URL. See `Agent.build_filter_url`.
+        :param entries: A {sku: (name, url)} mapping, with None for SKUs not on the listing.
+        """
+        now = time.time()
+        with self.__db.lock, self.__db.connection:
+            self.__db.connection.executemany(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?)",
+                [
+                    (listing, sku, *(entry or (None, None)), now)
+                    for sku, entry in entries.items()
+                ],
+            )
+            self.__db.connection.execute(
+                "DELETE FROM listings WHERE seen_at <= ?", (now - self.ttl,)
+            )
+
+    def close(self) -> None:
+        self.__db.close()
@@ -1,4 +1,9 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import threading
 
 
@@ -14,25 +19,158 @@ class SingletonMeta(type):
             return cls._instances[cls]
 
 
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as JSON lines.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records over to the listener thread as-is. The stock `QueueHandler` formats
+    every message in the calling thread, which is exactly the cost this avoids.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Tracebacks cannot cross threads safely, so render them now
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _RelayHandler(logging.Handler):
+    """
+    Hands the records received from other processes to the logger they were logged on,
+    so they are written by this process's handlers. See `Logger.receive`.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+class _LazyDirectoryMixin:
+    """
+    Creates the directory of the log file when it is first opened. With `delay=True`, nothing
+    touches the disk until a record is actually written, so importing a module stays free of side effects.
+    """
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class _RotatingFileHandler(_LazyDirectoryMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class _TimedRotatingFileHandler(
+    _LazyDirectoryMixin, logging.handlers.TimedRotatingFileHandler
+):
+    pass
+
+
 class Logger(metaclass=SingletonMeta):
     def __init__(self):
         self.logger = logging.getLogger("Loggy-The-Logger")
         self.logger.setLevel(logging.DEBUG)
+        self.__listener = None
+        self.configure()
+        atexit.register(self.stop)
+
+    def configure(
+        self,
+        filepath: str = "logs/dump.log",
+        json_lines: bool = False,
+        max_bytes: int = 10 * 1024**2,
+        backup_count: int = 5,
+        when: str = None,
+    ) -> None:
+        """
+        (Re)configures the handlers. Records are queued by the caller and written by a background thread.
+        :param filepath: The log file. It and its directory are only created once something is logged.
+        :param json_lines: Whether to write JSON lines instead of plain text.
+        :param max_bytes: The size at which the log file is rotated.
+        :param backup_count: The number of rotated files kept.
+        :param when: Rotate on time instead of size, e.g. "midnight" or "H". See `TimedRotatingFileHandler`.
+        """
+        self.stop()
 
         # Create handlers (e.g., console and file handlers)
         console_handler = logging.StreamHandler()
-        file_handler = logging.FileHandler("logs/dump.log")
+        if when:
+            file_handler = _TimedRotatingFileHandler(
+                filepath, when=when, backupCount=backup_count, delay=True
+            )
+        else:
+            file_handler = _RotatingFileHandler(
+                filepath, maxBytes=max_bytes, backupCount=backup_count, delay=True
+            )
 
         # Create formatters and add it to handlers
-        formatter = logging.Formatter(
-            "%(asctime)s | %(name)s [%(levelname)s] - %(message)s"
-        )
+        if json_lines:
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(
+                "%(asctime)s | %(name)s [%(levelname)s] - %(message)s"
+            )
         console_handler.setFormatter(formatter)
         file_handler.setFormatter(formatter)
 
-        # Add handlers to the logger
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        # Only the queue handler is attached to the logger, the listener thread does the writing
+        log_queue = queue.SimpleQueue()
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(_QueueHandler(log_queue))
+        self.__listener = logging.handlers.QueueListener(
+            log_queue, console_handler, file_handler, respect_handler_level=True
+        )
+        self.__listener.start()
+
+    def forward(self, log_queue) -> None:
+        """
+        Sends every record to another process instead of writing it, e.g. from a worker process, so a
+        single process writes (and rotates) the log file, with its own settings. See `receive`.
+        :param log_queue: A `multiprocessing.Queue` read by `receive` in the other process.
+        """
+        self.stop()
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        # The stock handler formats the message first, so records never carry unpicklable arguments
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    def receive(self, log_queue) -> logging.handlers.QueueListener:
+        """
+        Writes the records sent by `forward` from other processes with this process's handlers.
+        :param log_queue: A `multiprocessing.Queue` passed on to the other processes.
+        :return: The started listener. Stop it once the other processes have exited.
+        """
+        listener = logging.handlers.QueueListener(log_queue, _RelayHandler())
+        listener.start()
+        return listener
+
+    def stop(self) -> None:
+        """
+        Flushes the pending records and closes the handlers.
+        """
+        if self.__listener is not None:
+            self.__listener.stop()
+            for handler in self.__listener.handlers:
+                handler.close()
+            self.__listener = None
 
     def get_logger(self):
         return self.logger
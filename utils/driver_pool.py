@@ -0,0 +1,150 @@
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List
+
+from utils.custom_logger import Logger
+
+# Selenium is only imported once the first driver is launched
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+logger = Logger().get_logger()
+
+
+class DriverPool:
+    # Resources the scraper never needs: images, fonts and analytics
+    BLOCKED_URLS = [
+        "*.png",
+        "*.jpg",
+        "*.jpeg",
+        "*.gif",
+        "*.webp",
+        "*.svg",
+        "*.woff",
+        "*.woff2",
+        "*.ttf",
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*doubleclick.net*",
+        "*facebook.net*",
+        "*hotjar.com*",
+    ]
+
+    def __init__(self, size: int = 2, headless: bool = True):
+        """
+        A pool of reusable Chrome drivers. Drivers are launched on demand, up to `size`,
+        and keep their cookies and log-in state between borrowers.
+        :param size: The maximum number of drivers running at the same time.
+        :param headless: Whether to run Chrome without a window.
+        """
+        self.size = size
+        self.headless = headless
+        self.__idle: List["WebDriver"] = []
+        self.__all: List["WebDriver"] = []
+        self.__logged_in: Dict[int, bool] = {}
+        self.__available = threading.Condition()
+        atexit.register(self.close)
+
+    @contextmanager
+    def borrow(self, timeout: float = None):
+        """
+        Borrows a driver for the duration of a `with` block. A driver that raised is discarded.
+        :param timeout: How long to wait for a driver to be free, in seconds. Waits forever by default.
+        """
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, discard=True)
+            raise
+        else:
+            self.release(driver)
+
+    def acquire(self, timeout: float = None) -> "WebDriver":
+        """
+        Takes an idle driver, or launches a new one if the pool is not full.
+        :param timeout: How long to wait for a driver to be free, in seconds. Waits forever by default.
+        :return: The driver. Give it back with `release`.
+        """
+        with self.__available:
+            while not self.__idle and len(self.__all) >= self.size:
+                if not self.__available.wait(timeout):
+                    raise TimeoutError("No driver became available.")
+            if self.__idle:
+                return self.__idle.pop()
+            # Reserve the slot before launching Chrome outside of the lock
+            self.__all.append(None)
+
+        try:
+            driver = self.__launch()
+        except Exception:
+            with self.__available:
+                self.__all.remove(None)
+                self.__available.notify()
+            raise
+
+        with self.__available:
+            self.__all[self.__all.index(None)] = driver
+        return driver
+
+    def release(self, driver: "WebDriver", discard: bool = False) -> None:
+        """
+        Gives a driver back to the pool.
+        :param driver: The driver returned by `acquire`.
+        :param discard: Whether to quit the driver instead, e.g. after it crashed.
+        """
+        with self.__available:
+            if discard:
+                self.__all.remove(driver)
+                self.__logged_in.pop(id(driver), None)
+            else:
+                self.__idle.append(driver)
+            self.__available.notify()
+        if discard:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.debug("Failed to quit a discarded driver: %s", e)
+
+    def is_logged_in(self, driver: "WebDriver") -> bool:
+        return self.__logged_in.get(id(driver), False)
+
+    def mark_logged_in(self, driver: "WebDriver") -> None:
+        self.__logged_in[id(driver)] = True
+
+    def close(self) -> None:
+        """
+        Quits every driver.
+        """
+        with self.__available:
+            drivers = [d for d in self.__all if d is not None]
+            self.__all, self.__idle = [], []
+            self.__logged_in = {}
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.debug("Failed to quit a driver: %s", e)
+
+    def __launch(self) -> "WebDriver":
+        """
+        Launches a Chrome driver with images, fonts and analytics blocked.
+        """
+        from selenium import webdriver
+
+        logger.info("Launching a Chrome driver...")
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument("--headless=new")
+        options.add_argument("--window-size=1024,768")
+        options.add_experimental_option(
+            "prefs", {"profile.managed_default_content_settings.images": 2}
+        )
+        # Don't wait for stylesheets and images, explicit waits cover what is needed
+        options.page_load_strategy = "eager"
+
+        driver = webdriver.Chrome(options=options)
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.BLOCKED_URLS})
+        return driver
@@ -0,0 +1,143 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+from strain import Strain
+from utils.custom_logger import Logger
+from utils.sqlite_db import SQLiteDatabase
+
+logger = Logger().get_logger()
+
+
+class InventoryCache:
+    def __init__(self, filepath: str = "out/inventory.db", ttl: int = 3600):
+        """
+        Persists the digest of each store's last inventory payload, along with the strains it yielded once
+        priced and named, so the next fetch only reprocesses what changed. See `Agent.run`.
+        Snapshots are keyed by (store, filtered listing URL), as names and weights depend on the filters.
+        :param filepath: The SQLite database to store the snapshots in.
+        :param ttl: How long a snapshot is trusted, in seconds. Prices can change while quantities do not,
+        so every SKU is repriced at least this often.
+        """
+        self.ttl = ttl
+
+        self.__db = SQLiteDatabase(filepath)
+        with self.__db.connection:
+            self.__db.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS inventories (
+                    store_id TEXT NOT NULL,
+                    listing TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (store_id, listing)
+                )
+                """
+            )
+            self.__db.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS items (
+                    store_id TEXT NOT NULL,
+                    listing TEXT NOT NULL,
+                    sku TEXT NOT NULL,
+                    name TEXT,
+                    url TEXT,
+                    list_price REAL,
+                    display_price REAL,
+                    quantity INTEGER,
+                    promised_quantity INTEGER,
+                    grams REAL,
+                    PRIMARY KEY (store_id, listing, sku)
+                )
+                """
+            )
+
+    def get(self, store_id: int, listing: str) -> Optional[Tuple[str, Dict[str, Strain]]]:
+        """
+        Loads the last snapshot of a store.
+        :param store_id: The store the inventory was fetched from.
+        :param listing: The filtered listing URL. See `Agent.build_filter_url`.
+        :return: The digest of the payload and the priced strains keyed by SKU, or None if there is no
+        fresh snapshot.
+        """
+        with self.__db.lock:
+            row = self.__db.connection.execute(
+                "SELECT digest FROM inventories WHERE store_id = ? AND listing = ? AND fetched_at > ?",
+                (str(store_id), listing, time.time() - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self.__db.connection.execute(
+                "SELECT sku, name, url, list_price, display_price, quantity, promised_quantity, grams "
+                "FROM items WHERE store_id = ? AND listing = ?",
+                (str(store_id), listing),
+            ).fetchall()
+
+        strains = {
+            sku: Strain(
+                sku=sku,
+                name=name,
+                url=url,
+                list_price=list_price,
+                display_price=display_price,
+                quantity=quantity,
+                promised_quantity=promised_quantity,
+                grams=grams,
+            )
+            for sku, name, url, list_price, display_price, quantity, promised_quantity, grams in rows
+        }
+        return row[0], strains
+
+    def put(
+        self,
+        store_id: int,
+        listing: str,
+        digest: str,
+        strains: List[Strain],
+        refreshed: bool = True,
+    ) -> None:
+        """
+        Replaces the snapshot of a store, in a single transaction.
+        :param store_id: The store the inventory was fetched from.
+        :param listing: The filtered listing URL. See `Agent.build_filter_url`.
+        :param digest: The digest of the raw inventory payload.
+        :param strains: The priced strains of the inventory.
+        :param refreshed: Whether every strain was repriced. If not, the snapshot keeps its age, so strains
+        carried over from it are still repriced once it expires.
+        """
+        store_id = str(store_id)
+        with self.__db.lock, self.__db.connection:
+            if refreshed:
+                self.__db.connection.execute(
+                    "INSERT OR REPLACE INTO inventories VALUES (?, ?, ?, ?)",
+                    (store_id, listing, digest, time.time()),
+                )
+            else:
+                self.__db.connection.execute(
+                    "UPDATE inventories SET digest = ? WHERE store_id = ? AND listing = ?",
+                    (digest, store_id, listing),
+                )
+            self.__db.connection.execute(
+                "DELETE FROM items WHERE store_id = ? AND listing = ?", (store_id, listing)
+            )
+            self.__db.connection.executemany(
+                "INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        store_id,
+                        listing,
+                        s.sku,
+                        s.name,
+                        s.url,
+                        s.list_price,
+                        s.display_price,
+                        s.quantity,
+                        s.quantity_to_promise,
+                        s.grams,
+                    )
+                    for s in strains
+                ],
+            )
+        logger.debug(f"Inventory snapshot of store {store_id} cached ({len(strains):,} strains).")
+
+    def close(self) -> None:
+        self.__db.close()
@@ -0,0 +1,73 @@
+import codecs
+import json
+import re
+from typing import Iterable, Iterator
+
+_WHITESPACE = re.compile(r"[\s,]*")
+
+
+def iter_array_items(chunks: Iterable[bytes], key: str) -> Iterator[dict]:
+    """
+    Incrementally parses a JSON document and yields the elements of the array stored under `key`
+    as soon as each one has been received, without loading the whole document.
+    Only the first occurrence of `key` is read, and the rest of the document is not validated.
+    :param chunks: The raw document, e.g. `response.iter_content(...)`.
+    :param key: The name of the array, e.g. "InventoryItems".
+    :return: An iterator of the decoded elements.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    exhausted = False
+
+    def _read() -> bool:
+        nonlocal buffer, position, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            return False
+        # Drop what has already been consumed, so the buffer stays small
+        buffer = buffer[position:] + utf8.decode(chunk)
+        position = 0
+        return True
+
+    # --- Step 1: Find the start of the array --- #
+    while True:
+        match = marker.search(buffer)
+        if match:
+            position = match.end()
+            break
+        # Keep a tail in case the key is split across two chunks
+        position = max(0, len(buffer) - len(key) - 64)
+        if not _read():
+            raise ValueError(f'Key "{key}" not found in the JSON document.')
+
+    # --- Step 2: Decode one element at a time --- #
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position >= len(buffer):
+            if not _read():
+                raise ValueError(f'Unterminated "{key}" array.')
+            continue
+        if buffer[position] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The element is not complete yet
+            if not _read():
+                raise
+            continue
+
+        # A scalar is only complete once it is followed by a delimiter, e.g. "2" may become "2.5"
+        if not isinstance(item, (dict, list)) and not exhausted:
+            if end >= len(buffer) or buffer[end] not in ",] \t\r\n":
+                if _read():
+                    continue
+
+        position = end
+        yield item
@@ -0,0 +1,88 @@
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin
+
+
+class ListingParser(HTMLParser):
+    """
+    Collects the product anchors (`a.js-equalized-name[data-productid]`) and the
+    state of the 'Next' pagination button from an SQDC listing page.
+    Pages without pagination nor products, or with the date of birth form, are not listings,
+    most likely the age gate served in their place.
+    """
+
+    def __init__(self, page_url: str):
+        """
+        :param page_url: The URL the page was fetched from, used to resolve relative links.
+        """
+        super().__init__(convert_charrefs=True)
+        self.page_url = page_url
+        self.products: List[Tuple[str, str, str]] = []
+        self.has_next: bool = False
+        self.has_pagination: bool = False
+        self.has_age_gate: bool = False
+        self.__product_id: Optional[str] = None
+        self.__href: Optional[str] = None
+        self.__text: List[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        attributes = dict(attrs)
+        classes = (attributes.get("class") or "").split()
+
+        # Pagination: `li.page-item.next`, disabled on the last page
+        if tag == "ul" and "pagination" in classes:
+            self.has_pagination = True
+            return
+        if tag == "li" and "page-item" in classes:
+            self.has_pagination = True
+            if "next" in classes:
+                self.has_next = "disabled" not in classes
+            return
+
+        # Date of birth fields of the age gate. See `Agent.__login`.
+        if tag in ("input", "select") and attributes.get("id") in ("day", "month", "year"):
+            self.has_age_gate = True
+            return
+
+        # Product anchor
+        if (
+            tag == "a"
+            and "js-equalized-name" in classes
+            and attributes.get("data-productid")
+        ):
+            self.__product_id = attributes["data-productid"]
+            self.__href = urljoin(self.page_url, attributes.get("href") or "")
+            self.__text = []
+
+    @property
+    def is_listing(self) -> bool:
+        return not self.has_age_gate and (self.has_pagination or bool(self.products))
+
+    def handle_data(self, data: str) -> None:
+        if self.__product_id is not None:
+            self.__text.append(data)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "a" and self.__product_id is not None:
+            # Collapse whitespace the same way a rendered `.text` would
+            name = " ".join("".join(self.__text).split())
+            self.products.append((self.__product_id, name, self.__href))
+            self.__product_id = None
+            self.__href = None
+            self.__text = []
+
+
+def parse_listing(
+    html: str, page_url: str
+) -> Tuple[List[Tuple[str, str, str]], bool, bool]:
+    """
+    Parses a listing page.
+    :param html: The raw HTML of the listing page.
+    :param page_url: The URL the page was fetched from.
+    :return: A list of (product_id, name, url) tuples, whether there is a next page, and whether the
+    page is a listing at all. An empty listing is a listing with no matches, see `ListingParser`.
+    """
+    parser = ListingParser(page_url)
+    parser.feed(html)
+    parser.close()
+    return parser.products, parser.has_next, parser.is_listing
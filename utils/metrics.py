@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+
+class Sample:
+    def __init__(self, metrics: "Metrics", stage: str):
+        """
+        A single timed run of a stage. Use through `Metrics.stage`.
+        """
+        self.__metrics = metrics
+        self.__stage = stage
+        self.__counters: Dict[str, float] = {}
+        self.__started = 0.0
+
+    def add(self, counter: str, value: float = 1) -> None:
+        """
+        Adds to a counter of this stage, e.g. "bytes_in" or "items".
+        """
+        self.__counters[counter] = self.__counters.get(counter, 0) + value
+
+    def __enter__(self) -> "Sample":
+        self.__started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.__started
+        if exc_type is not None:
+            self.add("errors")
+        self.__metrics._record(self.__stage, elapsed, self.__counters)
+
+
+class _NullSample:
+    """
+    Stands in for `Sample` when metrics are disabled, so instrumented code costs a single call.
+    """
+
+    def add(self, counter: str, value: float = 1) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSample":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_SAMPLE = _NullSample()
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True, prefix: str = "sqdc"):
+        """
+        Aggregates the duration and counters of each stage of a scan.
+        :param enabled: Whether to record anything. Disabled metrics cost next to nothing.
+        :param prefix: The prefix of the exported Prometheus metric names.
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self.__stages: Dict[str, dict] = {}
+        self.__gauges: Dict[str, Callable[[], float]] = {}
+        self.__lock = threading.Lock()
+
+    def stage(self, name: str):
+        """
+        Times a stage:
+
+            with metrics.stage("pricing") as sample:
+                sample.add("items", len(skus))
+
+        :param name: The name of the stage.
+        :return: A context manager recording the stage when it exits.
+        """
+        if not self.enabled:
+            return _NULL_SAMPLE
+        return Sample(self, name)
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """
+        Registers a value read at export time, e.g. the retry count of the transport.
+        :param name: The name of the gauge.
+        :param read: A function returning the current value.
+        """
+        self.__gauges[name] = read
+
+    def _record(self, stage: str, elapsed: float, counters: Dict[str, float]) -> None:
+        with self.__lock:
+            totals = self.__stages.setdefault(
+                stage, {"count": 0, "seconds_total": 0.0, "seconds_max": 0.0}
+            )
+            totals["count"] += 1
+            totals["seconds_total"] += elapsed
+            totals["seconds_max"] = max(totals["seconds_max"], elapsed)
+            for counter, value in counters.items():
+                totals[counter] = totals.get(counter, 0) + value
+
+    def snapshot(self) -> dict:
+        """
+        :return: The aggregated stages and the current value of every gauge.
+        """
+        with self.__lock:
+            stages = {stage: dict(totals) for stage, totals in self.__stages.items()}
+        return {
+            "stages": stages,
+            "gauges": {name: read() for name, read in self.__gauges.items()},
+        }
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__stages = {}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        :return: The metrics in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        series: Dict[str, list] = {}
+        for stage, totals in snapshot["stages"].items():
+            for key, value in totals.items():
+                if key == "count":
+                    key = "calls_total"
+                elif not key.startswith("seconds_"):
+                    key = f"{key}_total"
+                name = f"{self.prefix}_stage_{key}"
+                series.setdefault(name, []).append(f'{name}{{stage="{stage}"}} {value}')
+        for gauge, value in snapshot["gauges"].items():
+            series[f"{self.prefix}_{gauge}"] = [f"{self.prefix}_{gauge} {value}"]
+
+        lines = []
+        for name, samples in series.items():
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write(self, filepath: str) -> None:
+        """
+        Writes the metrics to a file, as Prometheus text if it ends in `.prom`, as JSON otherwise.
+        The file is replaced atomically, so a scraper never reads it half-written.
+        :param filepath: The file to write.
+        """
+        directory = os.path.dirname(filepath)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        content = self.to_prometheus() if filepath.endswith(".prom") else self.to_json()
+        with open(f"{filepath}.tmp", "w") as f:
+            f.write(content)
+        os.replace(f"{filepath}.tmp", filepath)
@@ -0,0 +1,98 @@
+import json
+import time
+from typing import Dict, List
+
+from utils.custom_logger import Logger
+from utils.sqlite_db import SQLiteDatabase
+
+logger = Logger().get_logger()
+
+
+class PriceCache:
+    def __init__(
+        self, filepath: str = "out/prices.db", ttl: int = 3600, max_entries: int = 50_000
+    ):
+        """
+        Persists `calculatePrices` results between runs, keyed by (store_id, sku).
+        :param filepath: The SQLite database to store the prices in.
+        :param ttl: How long a cached price stays valid, in seconds.
+        :param max_entries: The maximum number of cached prices. The least recently used are evicted first.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.__db = SQLiteDatabase(filepath)
+        with self.__db.connection:
+            self.__db.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prices (
+                    store_id TEXT NOT NULL,
+                    sku TEXT NOT NULL,
+                    price TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (store_id, sku)
+                )
+                """
+            )
+            self.__db.connection.execute(
+                "CREATE INDEX IF NOT EXISTS prices_last_used ON prices (last_used)"
+            )
+
+    def get_many(self, store_id: int, skus: List[str]) -> Dict[str, dict]:
+        """
+        Looks up the cached prices of the given SKUs. Stale entries count as misses.
+        :param store_id: The store ID the prices were requested for.
+        :param skus: The SKUs to look up.
+        :return: A {sku: price JSON dict} mapping of the fresh entries found.
+        """
+        now = time.time()
+        found: Dict[str, dict] = {}
+        with self.__db.lock, self.__db.connection:
+            rows = self.__db.select_in(
+                "SELECT sku, price FROM prices WHERE store_id = ? AND fetched_at > ? AND sku IN ({})",
+                [str(store_id), now - self.ttl],
+                skus,
+            )
+            found.update((sku, json.loads(price)) for sku, price in rows)
+
+            self.__db.connection.executemany(
+                "UPDATE prices SET last_used = ? WHERE store_id = ? AND sku = ?",
+                [(now, str(store_id), sku) for sku in found],
+            )
+            self.hits += len(found)
+            self.misses += len(skus) - len(found)
+
+        return found
+
+    def put_many(self, store_id: int, prices: Dict[str, dict]) -> None:
+        """
+        Caches prices, then evicts expired and least recently used entries.
+        :param store_id: The store ID the prices were requested for.
+        :param prices: A {sku: price JSON dict} mapping.
+        """
+        now = time.time()
+        with self.__db.lock, self.__db.connection:
+            self.__db.connection.executemany(
+                "INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?)",
+                [
+                    (str(store_id), sku, json.dumps(price), now, now)
+                    for sku, price in prices.items()
+                ],
+            )
+            self.__db.connection.execute(
+                "DELETE FROM prices WHERE fetched_at <= ?", (now - self.ttl,)
+            )
+            self.__db.connection.execute(
+                """
+                DELETE FROM prices WHERE rowid IN (
+                    SELECT rowid FROM prices ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def close(self) -> None:
+        self.__db.close()
@@ -0,0 +1,71 @@
+import json
+import os
+import time
+from typing import List, Optional
+
+from utils.custom_logger import Logger
+
+logger = Logger().get_logger()
+
+
+class SessionCache:
+    def __init__(self, filepath: str = "out/session.json", ttl: int = 3600):
+        """
+        Persists the SQDC session cookies between runs.
+        :param filepath: The JSON file to store the cookies in.
+        :param ttl: The maximum age of the cached session, in seconds.
+        """
+        self.filepath = filepath
+        self.ttl = ttl
+
+    def load(self) -> Optional[dict]:
+        """
+        Loads the cached cookies, if any are cached and not expired.
+        :return: The cookies as a {name: value} dict, or None.
+        """
+        if not os.path.exists(self.filepath):
+            return None
+
+        try:
+            with open(self.filepath, "r") as f:
+                session = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read session cache `{self.filepath}`: {e}")
+            return None
+
+        if session.get("expires_at", 0) <= time.time():
+            logger.debug("Cached session has expired.")
+            return None
+
+        return session.get("cookies") or None
+
+    def save(self, selenium_cookies: List[dict]) -> None:
+        """
+        Saves cookies extracted from Selenium. The cache expires after the TTL,
+        or when the first cookie carrying an expiry does, whichever comes first.
+        :param selenium_cookies: The cookies as returned by `driver.get_cookies()`.
+        """
+        expiries = [c["expiry"] for c in selenium_cookies if c.get("expiry")]
+        expires_at = min([time.time() + self.ttl] + expiries)
+        session = {
+            "expires_at": expires_at,
+            "cookies": {c["name"]: c["value"] for c in selenium_cookies},
+        }
+
+        directory = os.path.dirname(self.filepath)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        tmp_filepath = f"{self.filepath}.tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump(session, f)
+        os.replace(tmp_filepath, self.filepath)
+        logger.debug(f"Session cached to `{self.filepath}`.")
+
+    def clear(self) -> None:
+        """
+        Removes the cached session.
+        """
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+import threading
+
+import requests
+
+from utils.custom_logger import Logger
+
+logger = Logger().get_logger()
+
+
+class Sink:
+    """
+    Receives the change events emitted by the `Watcher`. Subclass and override `emit`.
+    """
+
+    def emit(self, event: dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class StdoutSink(Sink):
+    def emit(self, event: dict) -> None:
+        """
+        Prints the event as a JSON line.
+        :param event: The event to print.
+        """
+        sys.stdout.write(json.dumps(event) + "\n")
+        sys.stdout.flush()
+
+
+class FileSink(Sink):
+    def __init__(self, filepath: str):
+        """
+        Appends events to a JSON lines file.
+        :param filepath: The file to append to.
+        """
+        directory = os.path.dirname(filepath)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.__file = open(filepath, "a")
+        self.__lock = threading.Lock()
+
+    def emit(self, event: dict) -> None:
+        with self.__lock:
+            self.__file.write(json.dumps(event) + "\n")
+            self.__file.flush()
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+class WebhookSink(Sink):
+    def __init__(self, url: str, timeout: float = 5):
+        """
+        POSTs each event as JSON to a webhook, e.g. a local notification service.
+        :param url: The URL of the webhook.
+        :param timeout: The request timeout, in seconds.
+        """
+        self.url = url
+        self.timeout = timeout
+        self.__session = requests.Session()
+
+    def emit(self, event: dict) -> None:
+        # A failing webhook must not stop the watcher
+        try:
+            response = self.__session.post(self.url, json=event, timeout=self.timeout)
+            if response.status_code >= 400:
+                logger.warning(
+                    f"Webhook `{self.url}` answered {response.status_code} to a `{event['type']}` event."
+                )
+        except requests.RequestException as e:
+            logger.warning(f"Failed to send event to webhook `{self.url}`: {e}")
+
+    def close(self) -> None:
+        self.__session.close()
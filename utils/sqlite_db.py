@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import threading
+from typing import Iterator, List, Sequence
+
+# Stay well below SQLite's bound parameter limit
+IN_CHUNK_SIZE = 500
+
+
+class SQLiteDatabase:
+    def __init__(self, filepath: str):
+        """
+        A SQLite connection shared across threads, for the stores and caches under `out/`.
+        SQLite connections are not thread-safe, so every use of `connection` must hold `lock`.
+
+            with db.lock, db.connection:
+                db.connection.execute(...)
+
+        :param filepath: The SQLite database to open. Its directory is created if needed.
+        """
+        self.filepath = filepath
+        directory = os.path.dirname(filepath)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filepath, check_same_thread=False)
+
+    def select_in(self, query: str, params: list, values: Sequence) -> List[tuple]:
+        """
+        Runs a query with an `IN` clause over any number of values, in chunks. Call it with `lock` held.
+        :param query: The query, with `{}` in place of the `IN` clause's placeholders, e.g.
+        "SELECT sku, name FROM listings WHERE listing = ? AND sku IN ({})".
+        :param params: The parameters before the `IN` clause.
+        :param values: The values of the `IN` clause.
+        :return: The rows of every chunk.
+        """
+        rows = []
+        for i in range(0, len(values), IN_CHUNK_SIZE):
+            chunk = values[i : i + IN_CHUNK_SIZE]
+            rows.extend(
+                self.connection.execute(
+                    query.format(",".join("?" * len(chunk))), [*params, *chunk]
+                ).fetchall()
+            )
+        return rows
+
+    def iter_batches(self, query: str, params: list, batch_size: int) -> Iterator[tuple]:
+        """
+        Reads the rows of a query in batches keyed on the rowid, so the lock is only held while a
+        batch is read, and large tables are never held in memory at once.
+        :param query: The query, selecting the rowid first, ending with "rowid > ? ORDER BY rowid LIMIT n".
+        :param params: The parameters before the rowid.
+        :param batch_size: The `LIMIT` of the query.
+        :return: An iterator of the rows, without their rowid.
+        """
+        last_rowid = 0
+        while True:
+            with self.lock:
+                batch = self.connection.execute(query, [*params, last_rowid]).fetchall()
+            for row in batch:
+                yield row[1:]
+            if len(batch) < batch_size:
+                return
+            last_rowid = batch[-1][0]
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from typing import Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.custom_logger import Logger
+
+logger = Logger().get_logger()
+
+
+class TransportError(Exception):
+    def __init__(self, message: str, response: requests.Response = None):
+        """
+        Raised when a request still fails after all retries.
+        :param message: The error message.
+        :param response: The last response received, if any. Its body is read and its connection released.
+        """
+        super().__init__(message)
+        self.response = response
+
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        """
+        Spaces out calls so that at most `rate` happen per second, across all threads.
+        :param rate: The maximum number of calls per second.
+        """
+        self.__interval = 1.0 / rate
+        self.__next_slot = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Blocks until the caller is allowed to proceed.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            wait = self.__next_slot - now
+            self.__next_slot = max(now, self.__next_slot) + self.__interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Transport:
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        timeout: Union[float, Tuple[float, float]] = (5, 30),
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10,
+        rate_limit: Optional[float] = None,
+        pool_size: int = 10,
+    ):
+        """
+        A shared, pooled HTTP session for all calls to the SQDC website.
+        :param timeout: The default (connect, read) timeout of a request, in seconds.
+        :param max_retries: How many times a failed request is retried.
+        :param backoff: The base delay of the exponential backoff, in seconds.
+        :param max_backoff: The maximum delay between two attempts, in seconds.
+        :param rate_limit: The maximum number of requests per second, or None for no limit.
+        :param pool_size: The number of keep-alive connections kept per host.
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_count = 0
+        self.__rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.__lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request, retrying connection errors and 429/5xx responses with jittered exponential backoff.
+        :param method: The HTTP method.
+        :param url: The URL to request.
+        :param kwargs: Passed on to `requests.Session.request`.
+        :return: The response. Non-retryable error statuses are returned as-is for the caller to handle.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            if self.__rate_limiter:
+                self.__rate_limiter.acquire()
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise TransportError(f"{method} {url} failed: {e}") from e
+                logger.debug("%s %s failed (%s), retrying...", method, url, e)
+                self.__sleep(attempt)
+                attempt += 1
+                continue
+
+            if response.status_code not in self.RETRY_STATUSES:
+                return response
+
+            if attempt >= self.max_retries:
+                # Read the body so it stays available on the error, and give the connection back
+                response.content
+                response.close()
+                raise TransportError(
+                    f"{method} {url} failed with status {response.status_code} "
+                    f"after {attempt + 1} attempts",
+                    response=response,
+                )
+            logger.debug(
+                "%s %s returned %s, retrying...", method, url, response.status_code
+            )
+            # Streamed responses hold their pooled connection until closed
+            retry_after = response.headers.get("Retry-After")
+            response.close()
+            self.__sleep(attempt, retry_after)
+            attempt += 1
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __sleep(self, attempt: int, retry_after: str = None) -> None:
+        """
+        Waits before the next attempt, honouring the server's Retry-After if it sent one.
+        :param attempt: The number of the attempt that just failed, starting at 0.
+        :param retry_after: The value of the Retry-After header, if any.
+        """
+        with self.__lock:
+            self.retry_count += 1
+
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        # Full jitter, so concurrent workers don't retry in lockstep
+        delay = random.uniform(0, delay)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_backoff, float(retry_after)))
+        time.sleep(delay)
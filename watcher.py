@@ -0,0 +1,152 @@
+import threading
+import time
+from typing import Dict, List
+
+from agent import Agent
+from strain import Strain
+from utils.custom_logger import Logger
+from utils.sinks import Sink, StdoutSink
+
+logger = Logger().get_logger()
+
+
+class Watcher:
+    def __init__(
+        self,
+        agent: Agent,
+        store_ids: List[int],
+        filters: dict = None,
+        sinks: List[Sink] = None,
+        min_interval: float = 60,
+        max_interval: float = 900,
+        emit_initial: bool = False,
+    ):
+        """
+        Polls a set of stores on an adaptive schedule, and emits only what changed between polls.
+        The interval is halved when quantities move, and stretched by half when the inventory is stable.
+        :param agent: The agent to scan with. Its session is reused across polls.
+        :param store_ids: The stores to watch.
+        :param filters: The filters to apply. See `Agent.build_filter_url` for more info.
+        :param sinks: Where to send the change events. Defaults to JSON lines on stdout.
+        :param min_interval: The shortest time between two polls, in seconds.
+        :param max_interval: The longest time between two polls, in seconds.
+        :param emit_initial: Whether to emit every strain as `new` on the first poll.
+        """
+        self.agent = agent
+        self.store_ids = store_ids
+        self.filters = filters
+        self.sinks = sinks or [StdoutSink()]
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.__emit_initial = emit_initial
+        self.__snapshots: Dict[int, Dict[str, Strain]] = {}
+        self.__stop = threading.Event()
+
+    def run_forever(self) -> None:
+        """
+        Polls until `stop` is called or the process is interrupted.
+        """
+        logger.info(f"Watching {len(self.store_ids):,} store(s)...")
+        try:
+            while not self.__stop.is_set():
+                started = time.monotonic()
+                self.poll_once()
+                elapsed = time.monotonic() - started
+                logger.info(f"Next poll in {self.interval:,.0f}s.")
+                self.__stop.wait(max(0.0, self.interval - elapsed))
+        except KeyboardInterrupt:
+            logger.info("Interrupted, stopping watcher...")
+        finally:
+            for sink in self.sinks:
+                sink.close()
+
+    def stop(self) -> None:
+        self.__stop.set()
+
+    def poll_once(self) -> List[dict]:
+        """
+        Scans every store once, emits the changes and adapts the polling interval.
+        :return: The emitted events.
+        """
+        results = self.agent.scan_stores(self.store_ids, filters=self.filters)
+
+        events: List[dict] = []
+        moved = False
+        for store_id, strains in results.items():
+            # Keep the previous snapshot of a failed store, it is retried on the next poll
+            if isinstance(strains, Exception):
+                continue
+
+            current = {s.sku: s for s in strains if s.is_processed}
+            previous = self.__snapshots.get(store_id)
+            self.__snapshots[store_id] = current
+            if previous is None:
+                if self.__emit_initial:
+                    events.extend(self.__event("new", store_id, s) for s in current.values())
+                continue
+
+            store_events, store_moved = self.__diff(store_id, previous, current)
+            events.extend(store_events)
+            moved |= store_moved
+
+        for event in events:
+            for sink in self.sinks:
+                sink.emit(event)
+
+        # Tighten while quantities move, back off while the inventory is stable
+        if moved:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+        logger.info(f"Poll complete, {len(events):,} change(s) emitted.")
+        return events
+
+    def __diff(
+        self, store_id: int, previous: Dict[str, Strain], current: Dict[str, Strain]
+    ) -> tuple:
+        """
+        Compares two snapshots of a store.
+        :param store_id: The store the snapshots were taken in.
+        :param previous: The previous snapshot, keyed by SKU.
+        :param current: The current snapshot, keyed by SKU.
+        :return: The change events, and whether any quantity moved.
+        """
+        events: List[dict] = []
+        moved = False
+
+        for sku, strain in current.items():
+            before = previous.get(sku)
+            if before is None:
+                events.append(self.__event("new", store_id, strain))
+                moved = True
+                continue
+            if strain.display_price < before.display_price:
+                events.append(
+                    self.__event(
+                        "price_drop", store_id, strain, old_price=before.display_price
+                    )
+                )
+            if strain.quantity != before.quantity:
+                moved = True
+
+        for sku in previous.keys() - current.keys():
+            events.append(self.__event("sold_out", store_id, previous[sku]))
+            moved = True
+
+        return events, moved
+
+    @staticmethod
+    def __event(event_type: str, store_id: int, strain: Strain, **extra) -> dict:
+        return {
+            "type": event_type,
+            "timestamp": time.time(),
+            "store_id": store_id,
+            "sku": strain.sku,
+            "name": strain.name,
+            "url": strain.url,
+            "price": strain.display_price,
+            "quantity": strain.quantity_to_promise,
+            **extra,
+        }